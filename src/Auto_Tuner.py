@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+#parallel hyperparameter search for the UKF on a recorded run
+#every candidate replays the log through a UKF with its own alpha, beta, kappa, measurement noise and cmd_vel noise in a worker process,
+#it is scored on position RMSE against ground truth and on NEES consistency, and the best one is written as a yaml
+#parameter file that UKF_Odom and Fleet_UKF_Odom load with rosparam
+
+import argparse
+import itertools
+import math
+import multiprocessing
+import numpy as np
+import yaml
+from Log_Replay import load_log
+from Batch_Smoother import ukf_forward
+from UKF_Core import UKF, UKF_Parameters, process_noise_model, INPUT_NOISE, WHEEL_VAR
+
+#tuned values and the node parameter names they are written under
+PARAMETERS = (('alpha', 'alpha'), ('beta', 'beta'), ('kappa', 'k'), ('wheel_var', None), ('imu_var', None), ('input_var', None))
+#noise variances are searched on a log scale
+LOG_SCALE = ('wheel_var', 'imu_var', 'input_var')
+POSE_DOF = 3
+
+#log of the worker process, loaded once by the pool initializer instead of being pickled with every candidate
+_log = None
+
+def init_worker(path):
+    global _log
+    _log = load_log(path)
+
+def ground_truth_pose(log, t):
+    #ground truth pose interpolated at the filter times, yaw is unwrapped before interpolating
+    valid = ~np.isnan(log['gt_pose'][:, 0])
+    gt_t = log['gt_pose_t'][valid]
+    gt_pose = np.asarray(log['gt_pose'][valid], dtype=np.float64)
+    pose = np.empty((len(t), 3))
+    pose[:, 0] = np.interp(t, gt_t, gt_pose[:, 0])
+    pose[:, 1] = np.interp(t, gt_t, gt_pose[:, 1])
+    pose[:, 2] = np.interp(t, gt_t, np.unwrap(gt_pose[:, 2]))
+    return pose
+
+def evaluate(config, log, square_root=True, process_noise=None):
+    #position RMSE and mean pose NEES of one candidate over the whole log, a candidate that diverges scores inf
+    #the UKF runs the node's process noise model, input_var is the variance of all three cmd_vel channels
+    #and process_noise the fixed diagonal of Q per second
+    params = {key: config[name] for name, key in PARAMETERS if key is not None}
+    if config.get('imu_var') is not None:
+        log = dict(log)
+        log['yaw_rate_var'] = np.full(len(log['t']), config['imu_var'])
+    try:
+        ukf = UKF(params=UKF_Parameters(**params), square_root=square_root,
+                  process_noise=process_noise_model(process_noise, [config['input_var']]*3))
+        forward = ukf_forward(log, ukf, config['wheel_var'])
+    except (ValueError, np.linalg.LinAlgError):
+        return math.inf, math.inf
+
+    #the first sample only sets the clock
+    t = forward['t'][1:]
+    states = forward['states'][1:]
+    state_covs = forward['state_covs'][1:]
+    error = states[:, :3] - ground_truth_pose(log, t)
+    error[:, 2] = (error[:, 2] + np.pi) % (2*np.pi) - np.pi
+    if not np.all(np.isfinite(error)):
+        return math.inf, math.inf
+
+    rmse = math.sqrt(np.mean(error[:, 0]**2 + error[:, 1]**2))
+    nees = np.einsum('ni,ni->n', error, np.linalg.solve(state_covs[:, :3, :3], error[..., None])[..., 0])
+    return rmse, float(np.mean(nees))
+
+def score(rmse, nees, nees_weight=1.0):
+    #RMSE penalized by how far the mean NEES is from its expected value in either direction
+    if not (math.isfinite(rmse) and math.isfinite(nees)) or nees <= 0:
+        return math.inf
+    return rmse*(1 + nees_weight*abs(math.log(nees/POSE_DOF)))
+
+def evaluate_job(job):
+    config, square_root, nees_weight, process_noise = job
+    rmse, nees = evaluate(config, _log, square_root, process_noise)
+    return config, rmse, nees, score(rmse, nees, nees_weight)
+
+def grid_configs(space):
+    #every combination of the candidate values
+    names = [name for name, _ in PARAMETERS]
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+def random_configs(space, count, rng):
+    #uniform samples between the smallest and largest candidate values, log uniform for the noise variances
+    for _ in range(count):
+        config = {}
+        for name, _ in PARAMETERS:
+            values = [v for v in space[name] if v is not None]
+            if not values:
+                config[name] = None
+            elif name in LOG_SCALE:
+                config[name] = float(np.exp(rng.uniform(np.log(min(values)), np.log(max(values)))))
+            else:
+                config[name] = float(rng.uniform(min(values), max(values)))
+        yield config
+
+def tune(path, configs, square_root=True, nees_weight=1.0, workers=None, process_noise=None):
+    #evaluate all candidates in a process pool, results are sorted best first
+    jobs = [(config, square_root, nees_weight, process_noise) for config in configs]
+    if workers == 1:
+        init_worker(path)
+        results = [evaluate_job(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(path,)) as pool:
+            results = pool.map(evaluate_job, jobs)
+    return sorted(results, key=lambda result: result[3])
+
+def write_config(path, config, square_root, rmse, nees, process_noise=None):
+    #private node parameters, load them into the node namespace with rosparam
+    params = {'alpha': float(config['alpha']), 'beta': float(config['beta']), 'kappa': float(config['kappa']),
+              'wheel_var': float(config['wheel_var']), 'square_root': square_root,
+              'input_noise': [float(config['input_var'])]*3}
+    if config.get('imu_var') is not None:
+        params['imu_var'] = float(config['imu_var'])
+    if process_noise:
+        params['process_noise'] = [float(q) for q in process_noise]
+    with open(path, 'w') as f:
+        f.write('#Auto_Tuner result, position RMSE %f, mean pose NEES %f\n' % (rmse, nees))
+        yaml.safe_dump(params, f, default_flow_style=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the UKF parameters and noise variances on a recorded run.')
+    parser.add_argument('log', help='bag or columnar log directory from Log_Recorder, it needs ground truth')
+    parser.add_argument('output', help='yaml file for the best parameters')
+    parser.add_argument('--alpha', type=float, nargs='+', default=[0.1, 0.5, 1.0])
+    parser.add_argument('--beta', type=float, nargs='+', default=[0.0])
+    parser.add_argument('--kappa', type=float, nargs='+', default=[0.0, 1.0, 3.0])
+    parser.add_argument('--wheel-var', type=float, nargs='+', default=[0.5, WHEEL_VAR, 4.0])
+    parser.add_argument('--imu-var', type=float, nargs='+', default=None,
+                        help='candidate IMU variances, the variance recorded in the log is used by default')
+    parser.add_argument('--input-var', type=float, nargs='+', default=[0.1*INPUT_NOISE[0], INPUT_NOISE[0], 10*INPUT_NOISE[0]],
+                        help='candidate cmd_vel variances, written as ~input_noise')
+    parser.add_argument('--process-noise', type=float, nargs=6, default=None,
+                        help='fixed diagonal of Q per second for every candidate, same as ~process_noise')
+    parser.add_argument('--random', type=int, default=0,
+                        help='number of random samples within the candidate ranges instead of the full grid')
+    parser.add_argument('--nees-weight', type=float, default=1.0)
+    parser.add_argument('--workers', type=int, default=None, help='process pool size, all cores by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--full-covariance', action='store_true',
+                        help='tune the full covariance UKF instead of the square root one')
+    args = parser.parse_args()
+
+    if 'gt_pose' not in load_log(args.log):
+        raise SystemExit('%s has no ground truth to tune against' % args.log)
+
+    space = {'alpha': args.alpha, 'beta': args.beta, 'kappa': args.kappa, 'wheel_var': args.wheel_var,
+             'imu_var': args.imu_var if args.imu_var else [None], 'input_var': args.input_var}
+    if args.random > 0:
+        configs = random_configs(space, args.random, np.random.default_rng(args.seed))
+    else:
+        configs = grid_configs(space)
+
+    square_root = not args.full_covariance
+    results = tune(args.log, configs, square_root, args.nees_weight, args.workers, args.process_noise)
+    config, rmse, nees, best = results[0]
+    if not math.isfinite(best):
+        raise SystemExit('no candidate ran through the whole log')
+    write_config(args.output, config, square_root, rmse, nees, args.process_noise)
+
+    print('evaluated %d candidates' % len(results))
+    for config, rmse, nees, value in results[:5]:
+        print('score %f, position RMSE %f, mean pose NEES %f: %s' % (value, rmse, nees, config))
+
+if __name__ == '__main__':
+    main()
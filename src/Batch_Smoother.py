@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+#offline full-trajectory unscented RTS smoother for recorded runs
+#a forward UKF pass keeps its predictions and cross covariances, then one backward pass smooths the whole run
+
+import argparse
+import math
+import numpy as np
+from Log_Replay import load_log
+from UKF_Core import UKF, UKF_Parameters, rts_smooth, measurement_covariance, process_noise_model, INPUT_NOISE, WHEEL_VAR
+
+def ukf_forward(log, ukf=None, wheel_var=WHEEL_VAR, z_cov=None, process_noise=None):
+    #forward UKF over an aligned log, keeping everything the backward pass needs as (T, ...) arrays
+    #a fixed z_cov replaces the recorded IMU variance and wheel_var on every step
+    #process_noise is the noise model of the default UKF, a given ukf keeps its own
+    ukf = UKF(process_noise=process_noise) if ukf is None else ukf
+
+    t = log['t']
+    T = len(t)
+    z = np.empty((T, 5))
+    z[:, 0] = log['yaw_rate']
+    z[:, 1:] = log['wheel_velocities']
+    u = log['cmd_vel']
+    dt = np.diff(t)
+    n = ukf.params.n
+
+    states = np.empty((T, n))
+    state_covs = np.empty((T, n, n))
+    pred_states = np.empty((T, n))
+    pred_covs = np.empty((T, n, n))
+    cross_covs = np.empty((T, n, n))
+
+    #the first sample only sets the clock, its prediction is the initial state itself
+    states[0], state_covs[0] = ukf.state, ukf.state_cov
+    pred_states[0], pred_covs[0], cross_covs[0] = ukf.state, ukf.state_cov, ukf.state_cov
+    for i in range(1, T):
+        pred_states[i], pred_covs[i] = ukf.predict(u[i], dt[i-1])
+        cross_covs[i] = ukf.cross_cov
+        step_cov = measurement_covariance(log['yaw_rate_var'][i], wheel_var) if z_cov is None else z_cov
+        states[i], state_covs[i] = ukf.update(z[i], step_cov)
+
+    return {'t': t, 'states': states, 'state_covs': state_covs,
+            'pred_states': pred_states, 'pred_covs': pred_covs, 'cross_covs': cross_covs}
+
+def smooth_log(log, ukf=None, wheel_var=WHEEL_VAR, process_noise=None):
+    forward = ukf_forward(log, ukf, wheel_var, process_noise=process_noise)
+    smoothed_states, smoothed_covs, _ = rts_smooth(forward['states'], forward['state_covs'], forward['pred_states'],
+                                                   forward['pred_covs'], forward['cross_covs'])
+    return {'t': forward['t'], 'filtered_states': forward['states'], 'filtered_covs': forward['state_covs'],
+            'smoothed_states': smoothed_states, 'smoothed_covs': smoothed_covs}
+
+def main():
+    parser = argparse.ArgumentParser(description='Smooth a whole recorded run with a forward UKF and a backward unscented RTS pass.')
+    parser.add_argument('log', help='bag or columnar log directory from Log_Recorder')
+    parser.add_argument('output', help='.npz file for the filtered and smoothed trajectories')
+    parser.add_argument('--alpha', type=float, default=1.0)
+    parser.add_argument('--beta', type=float, default=0.0)
+    parser.add_argument('--kappa', type=float, default=1.0)
+    parser.add_argument('--wheel-var', type=float, default=WHEEL_VAR)
+    parser.add_argument('--square-root', action='store_true')
+    parser.add_argument('--input-noise', type=float, nargs=3, default=INPUT_NOISE, help='cmd_vel variances, same as ~input_noise')
+    parser.add_argument('--process-noise', type=float, nargs=6, default=None, help='diagonal of Q per second, same as ~process_noise')
+    args = parser.parse_args()
+
+    log = load_log(args.log)
+    ukf = UKF(params=UKF_Parameters(alpha=args.alpha, beta=args.beta, k=args.kappa), square_root=args.square_root,
+              process_noise=process_noise_model(args.process_noise, args.input_noise))
+    result = smooth_log(log, ukf, args.wheel_var)
+    np.savez(args.output, **result)
+
+    print('smoothed %d steps' % len(result['t']))
+    if 'gt_pose' in log:
+        valid = ~np.isnan(log['gt_pose'][:, 0])
+        gt_t = log['gt_pose_t'][valid]
+        gt_x = np.interp(result['t'], gt_t, log['gt_pose'][valid, 0])
+        gt_y = np.interp(result['t'], gt_t, log['gt_pose'][valid, 1])
+        for name in ('filtered', 'smoothed'):
+            error = np.hypot(result[name + '_states'][:, 0] - gt_x, result[name + '_states'][:, 1] - gt_y)
+            print('%s position RMSE: %f' % (name, math.sqrt(np.mean(error**2))))
+
+if __name__ == '__main__':
+    main()
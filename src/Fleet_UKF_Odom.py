@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+import rospy
+from nav_msgs.msg import Odometry
+from geometry_msgs.msg import Twist
+from sensor_msgs.msg import Imu, JointState
+import threading
+from collections import deque
+import numpy as np
+from message_filters import ApproximateTimeSynchronizer, Subscriber
+from UKF_Core import Batch_UKF, UKF_Parameters, Cubature_Parameters, Measurement_Model, process_noise_model, INPUT_NOISE, WHEEL_VAR
+from UKF_Odom import twist_to_input, sensor_measurement, odometry_message
+
+#runs the UKF odometry of a whole fleet of mecanum bases in one process
+#every robot lives under its own namespace, its synchronized sensor bundles are queued and all pending robots are advanced together on each tick
+#a robot with several bundles since the last tick is stepped once per bundle, so sensors at or above ~rate lose nothing to timer jitter
+class Fleet_UKF_Odometry:
+    def __init__(self):
+        rospy.loginfo("Initializing fleet node...")
+
+        self.robots = rospy.get_param('~robots', [])
+        if not self.robots:
+            rospy.logwarn("~robots is empty, no robot namespaces to filter")
+        N = len(self.robots)
+
+        #~cubature swaps the unscented points for the 2n equally weighted points of the cubature rule, alpha, beta and kappa are unused then
+        if rospy.get_param('~cubature', False):
+            ukf_params = Cubature_Parameters(n=6)
+        else:
+            ukf_params = UKF_Parameters(n=6,
+                                        alpha=rospy.get_param('~alpha', 1.0),
+                                        beta=rospy.get_param('~beta', 0.0),
+                                        k=rospy.get_param('~kappa', 1.0),
+                                        lambda_value=rospy.get_param('~lambda', None))
+        measurement_model = Measurement_Model(wheel_radius=rospy.get_param('~wheel_radius', 0.0762),
+                                              wheel_pair_separation=rospy.get_param('~wheel_pair_separation', 0.488),
+                                              wheel_separation=rospy.get_param('~wheel_separation', 0.44715),
+                                              wheel_width=rospy.get_param('~wheel_width', 0.05))
+        self.engine = Batch_UKF(N, params=ukf_params, measurement_model=measurement_model,
+                                square_root=rospy.get_param('~square_root', False),
+                                joseph_form=rospy.get_param('~joseph_form', True),
+                                process_noise=process_noise_model(rospy.get_param('~process_noise', None),
+                                                                  rospy.get_param('~input_noise', INPUT_NOISE),
+                                                                  rospy.get_param('~process_noise_resolution', 1e-4)))
+        #same measurement noise parameters as UKF_Odom so one tuned yaml file serves both
+        self.wheel_var = rospy.get_param('~wheel_var', WHEEL_VAR)
+        self.imu_var = rospy.get_param('~imu_var', None)
+
+        self.prev_time = np.full(N, np.nan)
+        #sensor bundles per robot that have not been filtered yet, oldest first, bounded by ~queue_size
+        #bundles pushed out of a full queue are counted and reported
+        self.pending = {}
+        self.queue_size = rospy.get_param('~queue_size', 100)
+        self.dropped = np.zeros(N, dtype=np.int64)
+        self.lock = threading.Lock()
+
+        self.odom_pubs = []
+        self.filter_syncs = []
+        for i, ns in enumerate(self.robots):
+            ns = '/' + ns.strip('/')
+            self.odom_pubs.append(rospy.Publisher(ns + '/ukf_odom', Odometry, queue_size=10))
+
+            imu_sub = Subscriber(ns + '/imu_sim', Imu)
+            wheel_encoder_sub = Subscriber(ns + '/wheel_encoder_sim', JointState)
+            cmd_vel_sub = Subscriber(ns + '/mobile_base_controller/cmd_vel', Twist)
+            filter_sync = ApproximateTimeSynchronizer([imu_sub, wheel_encoder_sub, cmd_vel_sub], queue_size=10, slop=5, allow_headerless=True)
+            filter_sync.registerCallback(self.sensor_callback, i)
+            self.filter_syncs.append(filter_sync)
+
+        self.timer = rospy.Timer(rospy.Duration(1.0/rospy.get_param('~rate', 100.0)), self.tick)
+
+        rospy.loginfo("fleet init done for %d robots" % N)
+
+    def sensor_callback(self, imu_data, wheel_encoder_data, cmd_vel, index):
+        measurement, z_cov = sensor_measurement(imu_data, wheel_encoder_data, self.wheel_var, self.imu_var)
+        with self.lock:
+            queue = self.pending.setdefault(index, deque())
+            if len(queue) >= self.queue_size:
+                queue.popleft()
+                self.dropped[index] += 1
+                rospy.logwarn_throttle(5.0, "%s: filter queue full, dropped %d sensor bundles so far" % (self.robots[index], self.dropped[index]))
+            queue.append((imu_data.header.stamp, twist_to_input(cmd_vel), measurement, z_cov))
+
+    def tick(self, event):
+        with self.lock:
+            queues, self.pending = self.pending, {}
+        #one stacked step per round, every round takes the oldest remaining bundle of each robot
+        while queues:
+            self.step({i: queue.popleft() for i, queue in queues.items()})
+            queues = {i: queue for i, queue in queues.items() if queue}
+
+    def step(self, pending):
+        index = np.array(sorted(pending))
+        stamps = [pending[i][0] for i in index]
+        t = np.array([stamp.to_sec() for stamp in stamps])
+
+        #the first bundle of every robot only sets its clock, same as the single robot node
+        first = np.isnan(self.prev_time[index])
+        dt = t - self.prev_time[index]
+        self.prev_time[index] = t
+        keep = ~first
+        if not keep.any():
+            return
+        index, dt = index[keep], dt[keep]
+        stamps = [stamp for stamp, k in zip(stamps, keep) if k]
+
+        u = np.array([pending[i][1] for i in index])
+        z = np.array([pending[i][2] for i in index])
+        z_cov = np.array([pending[i][3] for i in index])
+
+        states, state_covs = self.engine.step(u, dt, z, z_cov, index)
+
+        for stamp, i, state, state_cov in zip(stamps, index, states, state_covs):
+            self.odom_pubs[i].publish(odometry_message(stamp, state, state_cov))
+
+
+def main():
+    rospy.init_node('Fleet_UKF_Odom')
+    fleet_node = Fleet_UKF_Odometry()
+    rospy.loginfo('starting fleet ukf_odom')
+    rospy.spin()
+    rospy.loginfo('done')
+
+if __name__=='__main__':
+    main()
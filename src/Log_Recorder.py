@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import rospy
+from nav_msgs.msg import Odometry
+from geometry_msgs.msg import PoseStamped, TwistStamped, Twist
+from sensor_msgs.msg import Imu, JointState
+import threading
+from message_filters import ApproximateTimeSynchronizer, Subscriber
+from Odom_Log import Log_Writer
+from Log_Replay import quaternion_yaw
+
+#records one columnar log row per synchronized sensor bundle, together with the latest ground truth and filter outputs
+class Log_Recorder:
+    def __init__(self):
+        path = rospy.get_param('~path', 'odom_log')
+        self.writer = Log_Writer(path, chunk_size=rospy.get_param('~chunk_size', 1024))
+        self.lock = threading.Lock()
+
+        self.gt_pose = None
+        self.gt_twist = None
+        self.ukf_state = None
+        self.ekf_state = None
+
+        imu_sub = Subscriber('/imu_sim', Imu)
+        wheel_encoder_sub = Subscriber('/wheel_encoder_sim', JointState)
+        cmd_vel_sub = Subscriber('/mobile_base_controller/cmd_vel', Twist)
+        self.sensor_sync = ApproximateTimeSynchronizer([imu_sub, wheel_encoder_sub, cmd_vel_sub], queue_size=10, slop=5, allow_headerless=True)
+        self.sensor_sync.registerCallback(self.sensor_callback)
+
+        self.gt_pose_sub = rospy.Subscriber('/omni/ground_truth/pose', PoseStamped, self.gt_pose_callback, queue_size=10)
+        self.gt_twist_sub = rospy.Subscriber('/omni/ground_truth/twist', TwistStamped, self.gt_twist_callback, queue_size=10)
+        self.ukf_sub = rospy.Subscriber('/ukf_odom', Odometry, self.ukf_callback, queue_size=10)
+        self.ekf_sub = rospy.Subscriber('/ekf_odom', Odometry, self.ekf_callback, queue_size=10)
+
+        rospy.on_shutdown(self.close)
+        rospy.loginfo("recording to %s" % path)
+
+    def gt_pose_callback(self, gt_pose):
+        pose = gt_pose.pose
+        self.gt_pose = (pose.position.x, pose.position.y, quaternion_yaw(pose.orientation))
+
+    def gt_twist_callback(self, gt_twist):
+        twist = gt_twist.twist
+        self.gt_twist = (twist.linear.x, twist.linear.y, twist.angular.z)
+
+    def odometry_state(self, odom):
+        pose = odom.pose.pose
+        twist = odom.twist.twist
+        return (pose.position.x, pose.position.y, quaternion_yaw(pose.orientation),
+                twist.linear.x, twist.linear.y, twist.angular.z)
+
+    def ukf_callback(self, odom):
+        self.ukf_state = self.odometry_state(odom)
+
+    def ekf_callback(self, odom):
+        self.ekf_state = self.odometry_state(odom)
+
+    def sensor_callback(self, imu_data, wheel_encoder_data, cmd_vel):
+        with self.lock:
+            if self.writer.closed:
+                return
+            self.writer.append(t=imu_data.header.stamp.to_sec(),
+                               yaw_rate=imu_data.angular_velocity.z,
+                               yaw_rate_var=imu_data.angular_velocity_covariance[8],
+                               wheel_velocities=wheel_encoder_data.velocity,
+                               cmd_vel=(cmd_vel.linear.x, cmd_vel.linear.y, cmd_vel.angular.z),
+                               gt_pose=self.gt_pose,
+                               gt_twist=self.gt_twist,
+                               ukf_state=self.ukf_state,
+                               ekf_state=self.ekf_state)
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
+
+
+def main():
+    rospy.init_node('Log_Recorder')
+    recorder_node = Log_Recorder()
+    rospy.loginfo('starting log recorder')
+    rospy.spin()
+    rospy.loginfo('done')
+
+if __name__ == '__main__':
+    main()
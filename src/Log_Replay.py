@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+#offline replay of recorded sensor streams through the UKF and EKF
+#the filters come from UKF_Core so nothing here waits on rospy timing, a run goes as fast as the CPU allows
+
+import argparse
+import math
+import os
+import numpy as np
+from Odom_Log import read_log
+from UKF_Core import UKF, EKF, UKF_Parameters, Cubature_Parameters, Measurement_Model, measurement_covariance, process_noise_model, INPUT_NOISE
+
+IMU_TOPIC = '/imu_sim'
+WHEEL_ENCODER_TOPIC = '/wheel_encoder_sim'
+CMD_VEL_TOPIC = '/mobile_base_controller/cmd_vel'
+GT_POSE_TOPIC = '/omni/ground_truth/pose'
+GT_TWIST_TOPIC = '/omni/ground_truth/twist'
+
+def quaternion_yaw(q):
+    #yaw of a planar orientation quaternion
+    return math.atan2(2*(q.w*q.z + q.x*q.y), 1 - 2*(q.y*q.y + q.z*q.z))
+
+def read_bag(path, imu_topic=IMU_TOPIC, wheel_encoder_topic=WHEEL_ENCODER_TOPIC, cmd_vel_topic=CMD_VEL_TOPIC,
+             gt_pose_topic=GT_POSE_TOPIC, gt_twist_topic=GT_TWIST_TOPIC):
+    #read the sensor, command and ground truth streams of a bag into plain arrays, one (time, values) pair per stream
+    #rosbag reads the file directly, no ROS master is needed
+    import rosbag
+
+    streams = {'imu': ([], []), 'wheel_encoder': ([], []), 'cmd_vel': ([], []), 'gt_pose': ([], []), 'gt_twist': ([], [])}
+    with rosbag.Bag(path) as bag:
+        for topic, msg, t in bag.read_messages(topics=[imu_topic, wheel_encoder_topic, cmd_vel_topic, gt_pose_topic, gt_twist_topic]):
+            if topic == imu_topic:
+                streams['imu'][0].append(msg.header.stamp.to_sec())
+                streams['imu'][1].append((msg.angular_velocity.z, msg.angular_velocity_covariance[8]))
+            elif topic == wheel_encoder_topic:
+                streams['wheel_encoder'][0].append(msg.header.stamp.to_sec())
+                streams['wheel_encoder'][1].append(tuple(msg.velocity))
+            elif topic == cmd_vel_topic:
+                #cmd_vel has no header so the bag receive time is used
+                streams['cmd_vel'][0].append(t.to_sec())
+                streams['cmd_vel'][1].append((msg.linear.x, msg.linear.y, msg.angular.z))
+            elif topic == gt_pose_topic:
+                streams['gt_pose'][0].append(msg.header.stamp.to_sec())
+                streams['gt_pose'][1].append((msg.pose.position.x, msg.pose.position.y, quaternion_yaw(msg.pose.orientation)))
+            elif topic == gt_twist_topic:
+                streams['gt_twist'][0].append(msg.header.stamp.to_sec())
+                streams['gt_twist'][1].append((msg.twist.linear.x, msg.twist.linear.y, msg.twist.angular.z))
+
+    return {name: (np.array(times, dtype=np.float64), np.array(values, dtype=np.float64)) for name, (times, values) in streams.items()}
+
+def latest_before(times, query):
+    #index of the last sample at or before every query time, the first sample is used for earlier queries
+    return np.clip(np.searchsorted(times, query, side='right') - 1, 0, len(times) - 1)
+
+def align_streams(streams):
+    #one filter step per IMU message, paired with the most recent wheel encoder and cmd_vel samples
+    #this replaces the ApproximateTimeSynchronizer of the live node
+    t, imu = streams['imu']
+    order = np.argsort(t)
+    t, imu = t[order], imu[order]
+
+    log = {'t': t, 'yaw_rate': imu[:, 0], 'yaw_rate_var': imu[:, 1]}
+    for name, key in (('wheel_encoder', 'wheel_velocities'), ('cmd_vel', 'cmd_vel')):
+        times, values = streams[name]
+        order = np.argsort(times)
+        log[key] = values[order][latest_before(times[order], t)]
+
+    #ground truth is kept at its own rate and interpolated where it is needed
+    for name in ('gt_pose', 'gt_twist'):
+        times, values = streams[name]
+        if len(times):
+            order = np.argsort(times)
+            log[name + '_t'] = times[order]
+            log[name] = values[order]
+    return log
+
+def load_log(path):
+    #columnar log directory from Log_Recorder, or a bag that is read and aligned
+    if os.path.isdir(path):
+        return read_log(path)
+    return align_streams(read_bag(path))
+
+def replay(log, ukf=None, ekf=None, wheel_var=1.5):
+    #run both filters over an aligned log and return their trajectories, covariances and ground truth errors
+    ukf = UKF() if ukf is None else ukf
+    ekf = EKF() if ekf is None else ekf
+
+    t = log['t']
+    T = len(t)
+    z = np.empty((T, 5))
+    z[:, 0] = log['yaw_rate']
+    z[:, 1:] = log['wheel_velocities']
+    u = log['cmd_vel']
+    dt = np.diff(t)
+
+    result = {'t': t[1:]}
+    ukf_states = np.empty((T - 1, 6))
+    ukf_covs = np.empty((T - 1, 6, 6))
+    ekf_states = np.empty((T - 1, 6))
+    ekf_covs = np.empty((T - 1, 6, 6))
+
+    #the first sample only sets the clock, same as the live node
+    for i in range(1, T):
+        z_cov = measurement_covariance(log['yaw_rate_var'][i], wheel_var)
+        ekf_states[i-1], ekf_covs[i-1] = ekf.step(u[i], dt[i-1], z[i], z_cov)
+        ukf_states[i-1], ukf_covs[i-1] = ukf.step(u[i], dt[i-1], z[i], z_cov)
+
+    result['ukf_states'], result['ukf_covs'] = ukf_states, ukf_covs
+    result['ekf_states'], result['ekf_covs'] = ekf_states, ekf_covs
+
+    if 'gt_pose' in log:
+        #rows without ground truth are skipped
+        valid = ~np.isnan(log['gt_pose'][:, 0])
+        gt_t = log['gt_pose_t'][valid]
+        gt_x = np.interp(result['t'], gt_t, log['gt_pose'][valid, 0])
+        gt_y = np.interp(result['t'], gt_t, log['gt_pose'][valid, 1])
+        result['gt_xy'] = np.column_stack((gt_x, gt_y))
+        result['ukf_error'] = np.hypot(ukf_states[:, 0] - gt_x, ukf_states[:, 1] - gt_y)
+        result['ekf_error'] = np.hypot(ekf_states[:, 0] - gt_x, ekf_states[:, 1] - gt_y)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded run through the UKF and EKF faster than real time.')
+    parser.add_argument('log', help='bag with the sensor, cmd_vel and ground truth topics, or a columnar log directory from Log_Recorder')
+    parser.add_argument('output', help='.npz file for the estimated trajectories and errors')
+    parser.add_argument('--alpha', type=float, default=1.0)
+    parser.add_argument('--beta', type=float, default=0.0)
+    parser.add_argument('--kappa', type=float, default=1.0)
+    parser.add_argument('--wheel-var', type=float, default=1.5)
+    parser.add_argument('--square-root', action='store_true')
+    parser.add_argument('--cubature', action='store_true', help='run the cubature rule in place of the unscented points')
+    parser.add_argument('--input-noise', type=float, nargs=3, default=INPUT_NOISE, help='cmd_vel variances, same as ~input_noise')
+    parser.add_argument('--process-noise', type=float, nargs=6, default=None, help='diagonal of Q per second, same as ~process_noise')
+    args = parser.parse_args()
+
+    log = load_log(args.log)
+    measurement_model = Measurement_Model()
+    if args.cubature:
+        params = Cubature_Parameters()
+    else:
+        params = UKF_Parameters(alpha=args.alpha, beta=args.beta, k=args.kappa)
+    #both filters run the node's process noise model
+    process_noise = process_noise_model(args.process_noise, args.input_noise)
+    ukf = UKF(params=params, measurement_model=measurement_model, square_root=args.square_root, process_noise=process_noise)
+    ekf = EKF(measurement_model=measurement_model, process_noise=process_noise)
+
+    result = replay(log, ukf, ekf, args.wheel_var)
+    np.savez(args.output, **result)
+
+    print('replayed %d steps' % len(result['t']))
+    if 'ukf_error' in result:
+        print('UKF position RMSE: %f' % math.sqrt(np.mean(result['ukf_error']**2)))
+        print('EKF position RMSE: %f' % math.sqrt(np.mean(result['ekf_error']**2)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+#Monte Carlo comparison of the UKF and EKF on simulated sensor data
+#every run draws a new noise realization of the GT_Sensor_Sim sensor model over the same ground truth trajectory,
+#runs both filters on it and the RMSE, NEES and NIS statistics are aggregated over the runs
+#runs are independent so they are spread over a process pool, and with a batch size above one every worker also
+#advances a whole chunk of runs at once as stacked filters so the per step cost is a few array operations per chunk
+
+import argparse
+import functools
+import math
+import multiprocessing
+import numpy as np
+from UKF_Core import UKF, EKF, Batch_UKF, Batch_EKF, UKF_Parameters, Cubature_Parameters, Measurement_Model, motion_model, measurement_covariance, \
+    process_noise_model, INPUT_NOISE
+
+#noise of the simulated sensors, same as GT_Sensor_Sim
+IMU_NOISE_STD = 0.2
+IMU_REPORTED_VAR = 0.2
+WHEEL_NOISE_STD = 1.5
+
+def default_commands(T=2000, dt=0.01):
+    #smoothly varying holonomic commands so the run has forward, lateral and turning motion
+    t = np.arange(T)*dt
+    u = np.empty((T, 3))
+    u[:, 0] = 0.4 + 0.2*np.sin(0.5*t)
+    u[:, 1] = 0.2*np.sin(0.3*t + 1.0)
+    u[:, 2] = 0.3*np.sin(0.2*t)
+    return t, u
+
+def ground_truth(t, u, initial_state=None):
+    #integrate the motion model along the commands, entry k is the state at t[k] after applying u[k]
+    states = np.empty((len(t), 6))
+    state = np.zeros(6) if initial_state is None else np.asarray(initial_state, dtype=np.float64)
+    states[0] = state
+    for k in range(1, len(t)):
+        state = motion_model(state, u[k], t[k] - t[k-1])
+        states[k] = state
+    return states
+
+def simulate_sensors(gt_states, measurement_model, rng):
+    #noisy IMU yaw rate and wheel velocities from the inverse kinematics, the same model GT_Sensor_Sim publishes
+    z = gt_states@measurement_model.C_T
+    z[:, 0] += rng.normal(0, IMU_NOISE_STD, len(z))
+    z[:, 1:] += rng.normal(0, WHEEL_NOISE_STD, (len(z), 4))
+    return z
+
+def wrap_angle(angle):
+    return (angle + np.pi) % (2*np.pi) - np.pi
+
+def filter_parameters(ukf_options):
+    #point set of the sigma point filter, the cubature rule ignores the unscented parameters
+    if ukf_options.get('cubature'):
+        return Cubature_Parameters()
+    return UKF_Parameters(**ukf_options['params'])
+
+def filter_process_noise(ukf_options):
+    #the node's process noise model, shared by both filters
+    return process_noise_model(ukf_options.get('process_noise'), ukf_options.get('input_noise', INPUT_NOISE))
+
+def run_filter(filter, t, u, z, z_cov, gt_states):
+    #step one filter through a run and return its per step position error, pose NEES and NIS
+    C, C_T = filter.measurement_model.C, filter.measurement_model.C_T
+    T = len(t)
+    position_error = np.empty(T - 1)
+    nees = np.empty(T - 1)
+    nis = np.empty(T - 1)
+    for k in range(1, T):
+        pred_state, pred_cov = filter.predict(u[k], t[k] - t[k-1])
+        innovation = z[k] - C@pred_state
+        innovation_cov = C@pred_cov@C_T + z_cov
+        nis[k-1] = innovation@np.linalg.solve(innovation_cov, innovation)
+
+        state, state_cov = filter.update(z[k], z_cov)
+        error = state[:3] - gt_states[k, :3]
+        error[2] = wrap_angle(error[2])
+        position_error[k-1] = math.hypot(error[0], error[1])
+        #the velocity block of the covariance can be singular, consistency is judged on the pose
+        nees[k-1] = error@np.linalg.solve(state_cov[:3, :3], error)
+    return position_error, nees, nis
+
+def monte_carlo_run(seed, t, u, gt_states, ukf_options):
+    #one noise realization, both filters start from the same prior at the true initial state
+    rng = np.random.default_rng(seed)
+    measurement_model = Measurement_Model()
+    z = simulate_sensors(gt_states, measurement_model, rng)
+    z_cov = measurement_covariance(IMU_REPORTED_VAR)
+
+    process_noise = filter_process_noise(ukf_options)
+    ukf = UKF(state=gt_states[0], params=filter_parameters(ukf_options), measurement_model=measurement_model,
+              square_root=ukf_options['square_root'], process_noise=process_noise)
+    ekf = EKF(state=gt_states[0], measurement_model=measurement_model, process_noise=process_noise)
+
+    result = {}
+    for name, filter in (('ukf', ukf), ('ekf', ekf)):
+        position_error, nees, nis = run_filter(filter, t, u, z, z_cov, gt_states)
+        result[name + '_rmse'] = math.sqrt(np.mean(position_error**2))
+        result[name + '_nees'] = nees
+        result[name + '_nis'] = nis
+    return result
+
+def run_batch_filter(filter, t, u, z, z_cov, gt_states):
+    #run_filter for a stack of filters, z is (M, T, 5) with one noise realization per filter
+    C, C_T = filter.measurement_model.C, filter.measurement_model.C_T
+    M, T = z.shape[:2]
+    position_error = np.empty((M, T - 1))
+    nees = np.empty((M, T - 1))
+    nis = np.empty((M, T - 1))
+    for k in range(1, T):
+        pred_states, pred_covs = filter.predict(u[k], t[k] - t[k-1])
+        innovation = z[:, k] - pred_states@C_T
+        innovation_cov = C@pred_covs@C_T + z_cov
+        nis[:, k-1] = np.einsum('ni,ni->n', innovation, np.linalg.solve(innovation_cov, innovation[..., None])[..., 0])
+
+        states, state_covs = filter.update(z[:, k], z_cov)
+        error = states[:, :3] - gt_states[k, :3]
+        error[:, 2] = wrap_angle(error[:, 2])
+        position_error[:, k-1] = np.hypot(error[:, 0], error[:, 1])
+        nees[:, k-1] = np.einsum('ni,ni->n', error, np.linalg.solve(state_covs[:, :3, :3], error[..., None])[..., 0])
+    return position_error, nees, nis
+
+def monte_carlo_batch(seeds, t, u, gt_states, ukf_options):
+    #a chunk of runs advanced together, every run draws its noise from its own seed so the results match monte_carlo_run
+    M = len(seeds)
+    measurement_model = Measurement_Model()
+    z = np.stack([simulate_sensors(gt_states, measurement_model, np.random.default_rng(seed)) for seed in seeds])
+    z_cov = measurement_covariance(IMU_REPORTED_VAR)
+
+    process_noise = filter_process_noise(ukf_options)
+    ukf = Batch_UKF(M, states=gt_states[0], params=filter_parameters(ukf_options), measurement_model=measurement_model,
+                    square_root=ukf_options['square_root'], process_noise=process_noise)
+    ekf = Batch_EKF(M, states=gt_states[0], measurement_model=measurement_model, process_noise=process_noise)
+
+    results = [{} for _ in range(M)]
+    for name, filter in (('ukf', ukf), ('ekf', ekf)):
+        position_error, nees, nis = run_batch_filter(filter, t, u, z, z_cov, gt_states)
+        rmse = np.sqrt(np.mean(position_error**2, axis=1))
+        for i, result in enumerate(results):
+            result[name + '_rmse'] = rmse[i]
+            result[name + '_nees'] = nees[i]
+            result[name + '_nis'] = nis[i]
+    return results
+
+def aggregate(results):
+    #RMSE statistics over runs, and NEES and NIS averaged over runs at every step and then over time
+    summary = {}
+    for name in ('ukf', 'ekf'):
+        rmse = np.array([r[name + '_rmse'] for r in results])
+        nees = np.mean([r[name + '_nees'] for r in results], axis=0)
+        nis = np.mean([r[name + '_nis'] for r in results], axis=0)
+        summary[name + '_rmse'] = rmse
+        summary[name + '_mean_nees'] = nees
+        summary[name + '_mean_nis'] = nis
+    return summary
+
+def monte_carlo(runs, t, u, gt_states, ukf_options, workers=None, seed=0, batch_size=1):
+    #seeds come from one parent seed so a study is reproducible regardless of the number of workers and the batch size
+    seeds = np.random.SeedSequence(seed).generate_state(runs)
+    if batch_size > 1:
+        jobs = [seeds[i:i + batch_size] for i in range(0, runs, batch_size)]
+        job = functools.partial(monte_carlo_batch, t=t, u=u, gt_states=gt_states, ukf_options=ukf_options)
+    else:
+        jobs = seeds
+        job = functools.partial(monte_carlo_run, t=t, u=u, gt_states=gt_states, ukf_options=ukf_options)
+    if workers == 1:
+        results = [job(j) for j in jobs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(job, jobs)
+    if batch_size > 1:
+        results = [r for chunk in results for r in chunk]
+    return aggregate(results)
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo UKF vs EKF comparison on simulated sensors.')
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--dt', type=float, default=0.01)
+    parser.add_argument('--workers', type=int, default=None, help='process pool size, all cores by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='runs advanced together as stacked filters in every worker, 1 steps every run on its own')
+    parser.add_argument('--alpha', type=float, default=1.0)
+    parser.add_argument('--beta', type=float, default=0.0)
+    parser.add_argument('--kappa', type=float, default=1.0)
+    parser.add_argument('--full-covariance', action='store_true',
+                        help='run the full covariance UKF instead of the square root one')
+    parser.add_argument('--cubature', action='store_true', help='run the cubature rule in place of the unscented points')
+    parser.add_argument('--input-noise', type=float, nargs=3, default=INPUT_NOISE, help='cmd_vel variances, same as ~input_noise')
+    parser.add_argument('--process-noise', type=float, nargs=6, default=None, help='diagonal of Q per second, same as ~process_noise')
+    parser.add_argument('--output', help='optional .npz file for the aggregated statistics')
+    args = parser.parse_args()
+
+    t, u = default_commands(args.steps, args.dt)
+    gt_states = ground_truth(t, u)
+    ukf_options = {'params': {'alpha': args.alpha, 'beta': args.beta, 'k': args.kappa},
+                   'square_root': not args.full_covariance, 'cubature': args.cubature,
+                   'input_noise': args.input_noise, 'process_noise': args.process_noise}
+
+    summary = monte_carlo(args.runs, t, u, gt_states, ukf_options, args.workers, args.seed, args.batch_size)
+    if args.output:
+        np.savez(args.output, **summary)
+
+    for name in ('ukf', 'ekf'):
+        rmse = summary[name + '_rmse']
+        print('%s position RMSE: %f +- %f, mean pose NEES (3 dof): %f, mean NIS (5 dof): %f'
+              % (name.upper(), rmse.mean(), rmse.std(), summary[name + '_mean_nees'].mean(), summary[name + '_mean_nis'].mean()))
+
+if __name__ == '__main__':
+    main()
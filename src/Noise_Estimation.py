@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+#offline measurement and process noise estimation over a whole recorded run
+#the batch counterpart of the online Noise_Estimator, it uses every step of the log instead of a sliding window
+#and reruns the UKF with its own estimate a few times so R and Q settle together
+#the cmd_vel input noise stays fixed, Q is the additive part on top of it, the same split as ~input_noise and ~process_noise
+
+import argparse
+import numpy as np
+import yaml
+from Log_Replay import load_log
+from Batch_Smoother import ukf_forward
+from Monte_Carlo import default_commands
+from UKF_Core import UKF, UKF_Parameters, Process_Noise, Noise_Estimator, Measurement_Model, motion_model, measurement_covariance, psd_sqrt, \
+    process_noise_model, INPUT_NOISE, WHEEL_VAR, IMU_ROWS, WHEEL_ROWS
+
+def noise_statistics(forward, z, C, C_T, Q=None):
+    #R as the mean of e e^T + C P C^T over the posterior residuals, diagonal as in the online Noise_Estimator
+    #Q matched to the covariances, the additive Q the pass ran with plus dx dx^T + P - P_pred summed and divided by the time span,
+    #projected back onto positive semi definite matrices
+    #the first entry of a forward pass only sets the clock and is left out
+    residuals = z[1:] - forward['states'][1:]@C_T
+    R = np.mean(residuals**2, axis=0) + np.mean(np.diagonal(C@forward['state_covs'][1:]@C_T, axis1=1, axis2=2), axis=0)
+
+    corrections = forward['states'][1:] - forward['pred_states'][1:]
+    Q_sum = np.einsum('ni,nj->ij', corrections, corrections) + np.sum(forward['state_covs'][1:] - forward['pred_covs'][1:], axis=0)
+    Q = Q_sum/(forward['t'][-1] - forward['t'][0]) + (0.0 if Q is None else Q)
+    Q_sqrt = psd_sqrt(0.5*(Q + Q.T))
+    return np.diag(R), Q_sqrt@Q_sqrt.T
+
+def estimate_noise(log, ukf=None, wheel_var=WHEEL_VAR, iterations=10):
+    #the first pass uses the recorded noise and the filter's own process noise, the default cmd_vel input noise for a new UKF,
+    #every further pass uses the previous estimate with the same input noise
+    ukf = UKF() if ukf is None else ukf
+    C, C_T = ukf.measurement_model.C, ukf.measurement_model.C_T
+    z = np.empty((len(log['t']), 5))
+    z[:, 0] = log['yaw_rate']
+    z[:, 1:] = log['wheel_velocities']
+
+    initial_state, initial_cov = ukf.state.copy(), ukf.state_cov.copy()
+    base = ukf.process_noise
+    R = None
+    for _ in range(iterations):
+        ukf.reset(initial_state, initial_cov)
+        forward = ukf_forward(log, ukf, wheel_var, R)
+        R, Q = noise_statistics(forward, z, C, C_T, ukf.process_noise.Q)
+        ukf.process_noise = Process_Noise(Q, input_cov=base.input_cov, dt_resolution=base.dt_resolution)
+    return R, Q
+
+def simulate_log(R, input_cov=None, Q=None, T=20000, dt=0.01, seed=0):
+    #aligned log of the motion and measurement models with known noise, the cmd_vel input noise and Q per second drive the
+    #true state, the log keeps the commanded values
+    rng = np.random.default_rng(seed)
+    t, u = default_commands(T, dt)
+    states = np.empty((T, 6))
+    state = np.zeros(6)
+    states[0] = state
+    for k in range(1, T):
+        w = np.zeros(3) if input_cov is None else rng.multivariate_normal(np.zeros(3), input_cov)
+        state = motion_model(state, u[k] + w, dt)
+        if Q is not None:
+            state = state + rng.multivariate_normal(np.zeros(6), Q*dt)
+        states[k] = state
+    z = states@Measurement_Model().C_T + rng.multivariate_normal(np.zeros(5), R, T)
+    return {'t': t, 'yaw_rate': z[:, 0], 'yaw_rate_var': np.full(T, R[0, 0]), 'wheel_velocities': z[:, 1:], 'cmd_vel': u}
+
+def online_estimate(log, ukf, z_cov, window):
+    #final R and Q per second of the online Noise_Estimator running inside the UKF over a log
+    ukf.noise_estimator = Noise_Estimator(window)
+    z = np.column_stack((log['yaw_rate'], log['wheel_velocities']))
+    dt = np.diff(log['t'])
+    for i in range(1, len(dt) + 1):
+        ukf.step(log['cmd_vel'][i], dt[i-1], z[i], z_cov)
+    return ukf.noise_estimator.measurement_cov(z_cov), ukf.noise_estimator.process_cov(1.0)
+
+def simulated_check(R, input_cov=None, Q=None, T=20000, window=1000, wheel_var=WHEEL_VAR, seed=0):
+    #run both estimators on a simulated log with known R and Q, the online estimate covers the input noise as well so it is
+    #compared against the total Q of the true model
+    log = simulate_log(R, input_cov, Q, T, seed=seed)
+    np.set_printoptions(precision=4, suppress=True)
+    print('true R diagonal:               %s' % np.diagonal(R))
+    print('true Q diagonal per second:    %s' % (np.zeros(6) if Q is None else np.diagonal(Q)))
+
+    offline_R, offline_Q = estimate_noise(log, UKF(), wheel_var)
+    print('offline R diagonal:            %s' % np.diagonal(offline_R))
+    print('offline Q diagonal per second: %s  (on top of the default cmd_vel noise %s)' % (np.diagonal(offline_Q), INPUT_NOISE))
+
+    total = np.zeros(6) if Q is None else np.diagonal(Q).copy()
+    if input_cov is not None:
+        total[3:] += np.diagonal(input_cov)/np.mean(np.diff(log['t']))
+    online_R, online_Q = online_estimate(log, UKF(), measurement_covariance(R[0, 0], wheel_var), window)
+    print('online R diagonal:             %s' % np.diagonal(online_R))
+    print('online Q diagonal per second:  %s  (true total %s)' % (np.diagonal(online_Q), total))
+
+def node_parameters(R, Q):
+    #the diagonal parts UKF_Odom reads, the wheel channels share one variance
+    return {'imu_var': float(R[IMU_ROWS, IMU_ROWS][0, 0]),
+            'wheel_var': float(np.mean(np.diagonal(R[WHEEL_ROWS, WHEEL_ROWS]))),
+            'process_noise': [float(q) for q in np.diagonal(Q)]}
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate the measurement and process noise of a recorded run.')
+    parser.add_argument('log', nargs='?', help='bag or columnar log directory from Log_Recorder')
+    parser.add_argument('output', nargs='?', help='.npz file for the R and Q estimates')
+    parser.add_argument('--yaml', help='optional yaml file with the matching UKF_Odom parameters')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--alpha', type=float, default=1.0)
+    parser.add_argument('--beta', type=float, default=0.0)
+    parser.add_argument('--kappa', type=float, default=1.0)
+    parser.add_argument('--wheel-var', type=float, default=WHEEL_VAR, help='wheel variance of the first pass')
+    parser.add_argument('--square-root', action='store_true')
+    parser.add_argument('--input-noise', type=float, nargs=3, default=INPUT_NOISE, help='cmd_vel variances, same as ~input_noise')
+    parser.add_argument('--process-noise', type=float, nargs=6, default=None, help='diagonal of Q per second of the first pass')
+    parser.add_argument('--simulate', action='store_true', help='check both estimators on a simulated run with known R and Q instead')
+    args = parser.parse_args()
+
+    if args.simulate:
+        #wheel noise of GT_Sensor_Sim, cmd_vel noise at the default and extra velocity noise
+        R = np.diag([0.04, 2.25, 2.25, 2.25, 2.25])
+        simulated_check(R, np.diag(INPUT_NOISE), np.diag([0, 0, 0, 0.5, 0.5, 0.2]))
+        return
+    if args.log is None or args.output is None:
+        parser.error('log and output are required without --simulate')
+
+    log = load_log(args.log)
+    ukf = UKF(params=UKF_Parameters(alpha=args.alpha, beta=args.beta, k=args.kappa), square_root=args.square_root,
+              process_noise=process_noise_model(args.process_noise, args.input_noise))
+    R, Q = estimate_noise(log, ukf, args.wheel_var, args.iterations)
+    np.savez(args.output, R=R, Q=Q)
+    if args.yaml:
+        with open(args.yaml, 'w') as f:
+            yaml.safe_dump(node_parameters(R, Q), f, default_flow_style=False)
+
+    np.set_printoptions(precision=6, suppress=True)
+    print('measurement noise R:\n%s' % R)
+    print('process noise Q per second:\n%s' % Q)
+
+if __name__ == '__main__':
+    main()
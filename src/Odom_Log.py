@@ -0,0 +1,121 @@
+#compact columnar log format for odometry runs
+#a log is a directory with one raw file per column plus a small JSON manifest of the column dtypes and shapes
+#columns are only ever appended to, and reads memory-map the files so opening an hours long log costs nothing
+
+import json
+import os
+import numpy as np
+
+MANIFEST = 'manifest.json'
+VERSION = 1
+
+#one row per synchronized sensor bundle, timestamps in float64 and everything else in float32
+COLUMNS = [
+    ('t', 'f8', ()),
+    ('yaw_rate', 'f4', ()),
+    ('yaw_rate_var', 'f4', ()),
+    ('wheel_velocities', 'f4', (4,)),
+    ('cmd_vel', 'f4', (3,)),
+    ('gt_pose', 'f4', (3,)),
+    ('gt_twist', 'f4', (3,)),
+    ('ukf_state', 'f4', (6,)),
+    ('ekf_state', 'f4', (6,)),
+]
+
+class Log_Writer:
+    #appends rows to a columnar log, rows are buffered in preallocated arrays and written a chunk at a time
+    def __init__(self, path, chunk_size=1024, columns=COLUMNS):
+        self.path = path
+        self.columns = columns
+        self.chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+
+        manifest_path = os.path.join(path, MANIFEST)
+        manifest = {'version': VERSION, 'columns': [[name, dtype, list(shape)] for name, dtype, shape in columns]}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                existing = json.load(f)
+            if existing != manifest:
+                raise ValueError("%s already holds a log with different columns" % path)
+            #a recorder killed mid flush leaves some columns longer than others, appending to them as they are would
+            #shift every later row, so all columns are cut back to the rows they all hold completely
+            row_sizes = [np.dtype(dtype).itemsize*int(np.prod(shape, dtype=np.int64)) for _, dtype, shape in columns]
+            paths = [os.path.join(path, name + '.bin') for name, _, _ in columns]
+            rows = min(os.path.getsize(p)//size if os.path.exists(p) else 0 for p, size in zip(paths, row_sizes))
+            for p, size in zip(paths, row_sizes):
+                if os.path.exists(p):
+                    os.truncate(p, rows*size)
+        else:
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f)
+
+        self.buffers = {name: np.full((chunk_size,) + tuple(shape), np.nan, dtype=dtype) for name, dtype, shape in columns}
+        self.files = {name: open(os.path.join(path, name + '.bin'), 'ab') for name, _, _ in columns}
+        self.count = 0
+        self.closed = False
+
+    def append(self, **row):
+        #columns missing from the row are stored as NaN
+        for name, _, _ in self.columns:
+            if name in row and row[name] is not None:
+                self.buffers[name][self.count] = row[name]
+            else:
+                self.buffers[name][self.count] = np.nan
+        self.count += 1
+        if self.count == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.count == 0:
+            return
+        for name, f in self.files.items():
+            f.write(self.buffers[name][:self.count].tobytes())
+            f.flush()
+        self.count = 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_log(path):
+    #memory-map every column of a log, the arrays are read only views of the files so nothing is parsed or copied
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest['version'] != VERSION:
+        raise ValueError("unsupported log version %s" % manifest['version'])
+
+    columns = [(name, np.dtype(dtype), tuple(shape)) for name, dtype, shape in manifest['columns']]
+
+    #a recorder that was killed mid write can leave columns of different lengths, only complete rows are used
+    lengths = []
+    for name, dtype, shape in columns:
+        row_size = dtype.itemsize*int(np.prod(shape, dtype=np.int64))
+        lengths.append(os.path.getsize(os.path.join(path, name + '.bin'))//row_size)
+    rows = min(lengths) if lengths else 0
+
+    log = {}
+    for name, dtype, shape in columns:
+        if rows == 0:
+            log[name] = np.empty((0,) + shape, dtype=dtype)
+        else:
+            log[name] = np.memmap(os.path.join(path, name + '.bin'), dtype=dtype, mode='r', shape=(rows,) + shape)
+
+    #ground truth is logged on the same rows as the sensors, rows before the first ground truth message hold NaN
+    #a run without any ground truth, on a real robot, leaves the columns out the same way a bag without the topics does
+    for name in ('gt_pose', 'gt_twist'):
+        if name in log:
+            if np.all(np.isnan(log[name][:, 0])):
+                del log[name]
+            else:
+                log[name + '_t'] = log['t']
+    return log
@@ -0,0 +1,1468 @@
+#pure NumPy filter library for the mecanum base odometry, the ROS node in UKF_Odom.py is a thin adapter around it
+#nothing in here depends on rospy so it can be imported for offline replay and benchmarking
+
+import math
+import numpy as np
+
+def motion_model(state, u, dt):
+    #nonlinear motion model, state can be a single (6,) state or a (N, 6) stack of states such as sigma points
+    #u is the commanded body velocity (vx, vy, omega), either one input for all states or one per state
+    u = np.asarray(u, dtype=np.float64)
+    vx = u[..., 0]
+    vy = u[..., 1]
+    omega = u[..., 2]
+
+    state = np.asarray(state, dtype=np.float64)
+    cos_theta = np.cos(state[..., 2])
+    sin_theta = np.sin(state[..., 2])
+
+    predicted = np.empty_like(state)
+    predicted[..., 0] = state[..., 0] + (vx*cos_theta - vy*sin_theta)*dt
+    predicted[..., 1] = state[..., 1] + (vy*cos_theta + vx*sin_theta)*dt
+    predicted[..., 2] = state[..., 2] + omega*dt
+    #input is linear and sets the velocity part of the state directly
+    predicted[..., 3] = vx
+    predicted[..., 4] = vy
+    predicted[..., 5] = omega
+
+    return predicted
+
+def motion_jacobian(state, u, dt):
+    #Jacobian of the motion model about a single state, used by the EKF in order to compare
+    vx = u[0]
+    vy = u[1]
+    cos_theta = math.cos(state[2])
+    sin_theta = math.sin(state[2])
+
+    Gx = np.eye(6)
+    Gx[0, 2] = -(vx*sin_theta + vy*cos_theta)*dt
+    Gx[0, 3] = dt*cos_theta
+    Gx[0, 4] = -dt*sin_theta
+    Gx[1, 2] = (vx*cos_theta - vy*sin_theta)*dt
+    Gx[1, 3] = dt*sin_theta
+    Gx[1, 4] = dt*cos_theta
+    Gx[2, 5] = dt
+
+    return Gx
+
+def input_jacobian(state, dt):
+    #Jacobian of the motion model with respect to the (vx, vy, omega) input, state can be (6,) or a (N, 6) stack
+    state = np.asarray(state, dtype=np.float64)
+    dt = np.asarray(dt, dtype=np.float64)
+    cos_theta = np.cos(state[..., 2])
+    sin_theta = np.sin(state[..., 2])
+
+    Gu = np.zeros(state.shape[:-1] + (6, 3))
+    Gu[..., 0, 0] = dt*cos_theta
+    Gu[..., 0, 1] = -dt*sin_theta
+    Gu[..., 1, 0] = dt*sin_theta
+    Gu[..., 1, 1] = dt*cos_theta
+    Gu[..., 2, 2] = dt
+    Gu[..., 3:, :] = np.eye(3)
+    return Gu
+
+def propagate_covariance(state_cov, jacobian):
+    #first order propagation of the covariance through a linearised model
+    return jacobian@state_cov@jacobian.T
+
+class UKF_Parameters:
+    #scaled unscented transform parameters and the weight tables derived from them
+    #the tables only depend on the state dimension and the parameters, so they are built once and reused every step
+    #the point set has a central point, the first one, whose covariance weight carries the alpha and beta terms
+    #the filters centre their deviations on the weighted mean so that weight applies
+    central = True
+
+    def __init__(self, n=6, alpha=1.0, beta=0.0, k=1.0, lambda_value=None):
+        self.n = n
+        self.lambda_override = None
+        self.set_parameters(alpha=alpha, beta=beta, k=k, lambda_value=lambda_value)
+
+    def set_parameters(self, alpha=None, beta=None, k=None, lambda_value=None, clear_lambda=False):
+        #only the given parameters change, the tables are rebuilt afterwards
+        if alpha is not None:
+            self.alpha = float(alpha)
+        if beta is not None:
+            self.beta = float(beta)
+        if k is not None:
+            self.k = float(k)
+        #lambda follows alpha and k unless it is given explicitly, clear_lambda makes it follow them again
+        if clear_lambda:
+            self.lambda_override = None
+        if lambda_value is not None:
+            self.lambda_override = float(lambda_value)
+        self.rebuild()
+
+    def rebuild(self):
+        n = self.n
+        if self.lambda_override is None:
+            self.lambda_value = self.alpha**2*(n + self.k) - n
+        else:
+            self.lambda_value = self.lambda_override
+
+        if n + self.lambda_value <= 0:
+            raise ValueError("n + lambda must be positive, got %f" % (n + self.lambda_value))
+
+        self.scale = math.sqrt(n + self.lambda_value)
+
+        mean_weights = 1/(2*(n + self.lambda_value))*np.ones(2*n+1)
+        cov_weights = np.copy(mean_weights)
+        mean_weights[0] = self.lambda_value/(self.lambda_value + n)
+        cov_weights[0] = mean_weights[0] + (1 - self.alpha**2 + self.beta)
+
+        mean_weights.flags.writeable = False
+        cov_weights.flags.writeable = False
+        self.mean_weights = mean_weights
+        self.cov_weights = cov_weights
+        self.augmented_tables = {}
+
+    def augmented(self, p):
+        #the same parameters for the state augmented with p noise dimensions, built on first use and kept until the next rebuild
+        params = self.augmented_tables.get(p)
+        if params is None:
+            params = UKF_Parameters(self.n + p, self.alpha, self.beta, self.k, self.lambda_override)
+            self.augmented_tables[p] = params
+        return params
+
+class Cubature_Parameters:
+    #third degree spherical radial cubature rule, 2n points at sqrt(n) along the covariance factor columns with equal weights
+    #it has the interface of UKF_Parameters so the same filters run it, there is no central point and no negative weight
+    central = False
+
+    def __init__(self, n=6):
+        self.n = n
+        self.rebuild()
+
+    def rebuild(self):
+        n = self.n
+        self.scale = math.sqrt(n)
+        weights = np.full(2*n, 1/(2*n))
+        weights.flags.writeable = False
+        self.mean_weights = weights
+        self.cov_weights = weights
+        self.augmented_tables = {}
+
+    def augmented(self, p):
+        params = self.augmented_tables.get(p)
+        if params is None:
+            params = Cubature_Parameters(self.n + p)
+            self.augmented_tables[p] = params
+        return params
+
+def cholesky_solve(L, B):
+    #solve (L L^T) X = B from the Cholesky factor L with a forward and a backward substitution
+    #also works on stacks of factors with a leading batch dimension
+    return np.linalg.solve(np.swapaxes(L, -1, -2), np.linalg.solve(L, B))
+
+def kalman_update(pred_state, pred_cov, z, z_cov, C, C_T, joseph_form=True):
+    #linear kalman measurement update, the innovation covariance is symmetric positive definite so it is factorised instead of inverted
+    PC_T = pred_cov@C_T
+    innovation_cov = C@PC_T + z_cov
+    L = np.linalg.cholesky(innovation_cov)
+
+    #K = P C^T S^-1, solved as S K^T = C P
+    K = cholesky_solve(L, PC_T.T).T
+    state = pred_state + K@(z - C@pred_state)
+
+    I_KC = np.eye(len(pred_state)) - K@C
+    if joseph_form:
+        #Joseph form keeps the covariance symmetric positive definite over long runs
+        state_cov = I_KC@pred_cov@I_KC.T + K@z_cov@K.T
+    else:
+        state_cov = I_KC@pred_cov
+    state_cov = 0.5*(state_cov + state_cov.T)
+    return state, state_cov
+
+def sigma_points(state, cov_sqrt, scale, central=True):
+    #first sigma point is just the current state, the rest are the scaled columns of the covariance square root
+    #without the central point this is the 2n point set of the cubature rule
+    n = len(state)
+    first = 1 if central else 0
+    spread = scale*cov_sqrt.T
+    sigma = np.empty((2*n+first, n))
+    sigma[0] = state
+    sigma[first:n+first] = state + spread
+    sigma[n+first:] = state - spread
+    return sigma
+
+def qr_factor(A):
+    #lower triangular S with S S^T = A^T A, from the R factor of a QR decomposition of the stacked rows of A
+    #also works on stacks of matrices with a leading batch dimension
+    R = np.linalg.qr(A, mode='r')
+    S = np.swapaxes(R, -1, -2)
+    #flip columns so the diagonal is non negative, this does not change S S^T
+    signs = np.where(np.diagonal(S, axis1=-2, axis2=-1) < 0, -1.0, 1.0)
+    return S*signs[..., None, :]
+
+def cholesky_update(S, x, sign=1.0):
+    #lower triangular factor of S S^T + sign x x^T by a sequence of rotations, S can be a (N, n, n) stack with x (N, n)
+    #a downdate that would lose positive definiteness raises LinAlgError like a failed Cholesky factorisation
+    S = np.array(S, dtype=np.float64)
+    x = np.array(x, dtype=np.float64)
+    n = S.shape[-1]
+    for k in range(n):
+        d = S[..., k, k]
+        r2 = d**2 + sign*x[..., k]**2
+        if np.any(r2 <= 0):
+            raise np.linalg.LinAlgError("Cholesky downdate is not positive definite")
+        r = np.sqrt(r2)
+        c = (r/d)[..., None]
+        s = (x[..., k]/d)[..., None]
+        S[..., k, k] = r
+        S[..., k+1:, k] = (S[..., k+1:, k] + sign*s*x[..., k+1:])/c
+        x[..., k+1:] = c*x[..., k+1:] - s*S[..., k+1:, k]
+    return S
+
+def sigma_sqrt(distance, cov_weights, noise_sqrt=None, central=True):
+    #square root of the weighted deviation covariance plus an optional additive noise factor, distance can be (N, 2n+1, n)
+    #every non central weight is positive so those points go through one QR, the central point is added or removed after
+    #with a rank one update depending on the sign of its weight
+    first = 1 if central else 0
+    factor = np.sqrt(cov_weights[first:, None])*distance[..., first:, :]
+    if central and cov_weights[0] >= 0:
+        factor = np.concatenate((math.sqrt(cov_weights[0])*distance[..., :1, :], factor), axis=-2)
+    if noise_sqrt is not None:
+        noise_sqrt = np.broadcast_to(noise_sqrt, distance.shape[:-2] + noise_sqrt.shape[-2:])
+        factor = np.concatenate((factor, np.swapaxes(noise_sqrt, -1, -2)), axis=-2)
+    S = qr_factor(factor)
+    if central and cov_weights[0] < 0:
+        S = cholesky_update(S, math.sqrt(-cov_weights[0])*distance[..., 0, :], -1.0)
+    return S
+
+def sqrt_kalman_update(pred_state, pred_sqrt, z, z_sqrt, C):
+    #square root form of the linear kalman update, pred_sqrt and z_sqrt are lower triangular factors of the covariances
+    CS = C@pred_sqrt
+    #innovation covariance factor from the stacked [C S, sqrt(R)]
+    innovation_sqrt = qr_factor(np.hstack((CS, z_sqrt)).T)
+
+    #K = P C^T S_z^-T S_z^-1, solved with the innovation factor
+    K = cholesky_solve(innovation_sqrt, CS@pred_sqrt.T).T
+    state = pred_state + K@(z - C@pred_state)
+
+    #Joseph form in factored form, [(I - K C) S, K sqrt(R)] is always a valid square root so no downdate can fail
+    I_KC = np.eye(len(pred_state)) - K@C
+    state_sqrt = qr_factor(np.hstack((I_KC@pred_sqrt, K@z_sqrt)).T)
+    return state, state_sqrt
+
+#rows of the measurement vector produced by each sensor, used for the partial updates of a single sensor
+IMU_ROWS = slice(0, 1)
+WHEEL_ROWS = slice(1, 5)
+
+#wheel encoder noise variance assumed when the encoders do not report one
+WHEEL_VAR = 1.5
+
+def measurement_covariance(imu_var, wheel_var=WHEEL_VAR):
+    #diagonal noise of the IMU yaw rate and the four wheel encoders
+    z_cov = wheel_var*np.eye(5)
+    z_cov[0,0] = imu_var
+    return z_cov
+
+def combine_measurements(measurements, m=5):
+    #information form fusion of several sensors measuring rows of the same linear model, e.g. redundant IMUs and encoder sets
+    #measurements is a list of (z, z_cov, rows), every sensor only adds R^-1 and R^-1 z to the information of its rows,
+    #so the cost is linear in the number of sensors and the filter update afterwards has the size of one measurement
+    #returns the equivalent (z, z_cov, rows), rows is None when every row is measured
+    information = np.zeros((m, m))
+    information_vector = np.zeros(m)
+    for z, z_cov, rows in measurements:
+        rows = slice(None) if rows is None else rows
+        L = np.linalg.cholesky(z_cov)
+        R_inv = cholesky_solve(L, np.eye(len(L)))
+        information[rows, rows] += R_inv
+        information_vector[rows] += R_inv@z
+
+    measured = np.flatnonzero(np.diagonal(information) > 0)
+    if len(measured) == 0 or measured[-1] - measured[0] + 1 != len(measured):
+        raise ValueError("combined sensors have to measure a contiguous block of rows")
+    rows = slice(int(measured[0]), int(measured[-1]) + 1)
+    L = np.linalg.cholesky(information[rows, rows])
+    z_cov = cholesky_solve(L, np.eye(len(L)))
+    z = cholesky_solve(L, information_vector[rows])
+    return z, 0.5*(z_cov + z_cov.T), None if len(measured) == m else rows
+
+def psd_sqrt(A):
+    #square root factor L L^T = A of a positive semi definite matrix, small negative eigenvalues from estimation noise are clipped
+    w, V = np.linalg.eigh(A)
+    return V*np.sqrt(np.clip(w, 0, None))
+
+class Noise_Estimator:
+    #adaptive measurement and process noise from a sliding window of update residuals and state corrections
+    #R is the mean of e e^T + C P C^T over the posterior residuals e, kept diagonal since the sensor channels are independent,
+    #the velocities carry no memory between steps so only C Q C^T + R shows in the data and a full R would absorb part of Q
+    #Q is matched to the covariances, every update adds dx dx^T + P - P_pred plus the process noise the filter used since the
+    #previous update, cmd_vel noise included, so in expectation it is the true process noise whatever noise was assumed and the
+    #estimate has it as its fixed point when it is fed back, once available it replaces the input noise and the fixed Q
+    #the sum is divided by the time the window spans so updates of several sensors within one interval share it
+    #the window is a ring of per update contributions with running sums so memory and time per step stay constant
+    def __init__(self, window=50, n=6, m=5, min_samples=None, floor=1e-6):
+        self.window = window
+        self.min_samples = window//2 if min_samples is None else min_samples
+        self.floor = floor
+        self.r_terms = np.zeros((window, m, m))
+        self.r_masks = np.zeros((window, m, m))
+        self.q_terms = np.zeros((window, n, n))
+        self.q_times = np.zeros(window)
+        self.r_sum = np.zeros((m, m))
+        self.r_count = np.zeros((m, m))
+        self.q_sum = np.zeros((n, n))
+        self.q_time = 0.0
+        self.head = 0
+        self.size = 0
+        #time and additive process noise of the predictions since the last recorded update
+        self.elapsed = 0.0
+        self.pending_cov = np.zeros((n, n))
+
+    def add(self, residual, residual_cov, q_term, elapsed, rows=None):
+        rows = slice(None) if rows is None else rows
+        i = self.head
+        #the oldest contribution leaves the running sums once the window is full
+        if self.size == self.window:
+            self.r_sum -= self.r_terms[i]
+            self.r_count -= self.r_masks[i]
+            self.q_sum -= self.q_terms[i]
+            self.q_time -= self.q_times[i]
+        else:
+            self.size += 1
+
+        self.r_terms[i] = 0
+        self.r_masks[i] = 0
+        self.r_terms[i, rows, rows] = np.outer(residual, residual) + residual_cov
+        self.r_masks[i, rows, rows] = 1
+        self.q_terms[i] = q_term
+        self.q_times[i] = elapsed
+        self.r_sum += self.r_terms[i]
+        self.r_count += self.r_masks[i]
+        self.q_sum += self.q_terms[i]
+        self.q_time += elapsed
+
+        self.head = (i + 1) % self.window
+        if self.head == 0:
+            #resum once per window so rounding errors of the running sums do not build up
+            self.r_sum = self.r_terms.sum(axis=0)
+            self.r_count = self.r_masks.sum(axis=0)
+            self.q_sum = self.q_terms.sum(axis=0)
+            self.q_time = self.q_times.sum()
+
+    def advance(self, dt, Q=None):
+        #a prediction over dt with additive noise Q, both are charged to the next recorded update
+        self.elapsed += dt
+        if Q is not None:
+            self.pending_cov = self.pending_cov + Q
+
+    def record(self, C, z, pred_state, pred_cov, state, state_cov, rows=None):
+        #contribution of one update, called by the filters right after it with the state and covariance from before it
+        correction = state - pred_state
+        q_term = np.outer(correction, correction) + state_cov - pred_cov + self.pending_cov
+        self.add(z - C@state, C@state_cov@C.T, q_term, self.elapsed, rows)
+        self.elapsed = 0.0
+        self.pending_cov = np.zeros_like(self.pending_cov)
+
+    def measurement_cov(self, z_cov, rows=None):
+        #estimated covariance of the measured rows once they have enough samples, the given z_cov until then
+        rows = slice(None) if rows is None else rows
+        count = np.diagonal(self.r_count[rows, rows])
+        if np.min(count) < self.min_samples:
+            return z_cov
+        return np.diag(np.diagonal(self.r_sum[rows, rows])/count + self.floor)
+
+    def process_cov(self, dt):
+        #estimated additive process noise over dt, None until the window has enough samples
+        #single samples can be indefinite, their mean is projected back onto the positive semi definite matrices
+        if self.size < self.min_samples or self.q_time <= 0:
+            return None
+        Q_sqrt = psd_sqrt(0.5*(self.q_sum + self.q_sum.T)/self.q_time)
+        return Q_sqrt@Q_sqrt.T*dt
+
+class Process_Noise:
+    #process noise of the motion model, an additive Q per second and an optional covariance of the cmd_vel input
+    #the additive part over dt and its square root factor only depend on dt, so they are computed once per dt bucket and cached
+    #the input noise is carried through the motion model itself, by augmented sigma points in the UKF and the input Jacobian in the EKF
+    def __init__(self, Q=None, input_cov=None, dt_resolution=1e-4, cache_size=256):
+        self.Q = None if Q is None else np.array(Q, dtype=np.float64)
+        self.input_cov = None if input_cov is None else np.array(input_cov, dtype=np.float64)
+        self.input_sqrt = None if input_cov is None else np.linalg.cholesky(self.input_cov)
+        self.dt_resolution = dt_resolution
+        self.cache_size = cache_size
+        self.cache = {}
+
+    def entry(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            #the bucket count stays small with a steady sensor rate, a full cache is simply dropped
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            Q = self.Q*(key*self.dt_resolution)
+            entry = (Q, psd_sqrt(Q))
+            self.cache[key] = entry
+        return entry
+
+    def additive(self, dt):
+        #(Q, factor) of the bucket dt falls in, stacked for an array of dt, None without additive noise
+        if self.Q is None:
+            return None
+        keys = np.rint(np.asarray(dt, dtype=np.float64)/self.dt_resolution).astype(np.int64)
+        if keys.ndim == 0:
+            return self.entry(int(keys))
+        unique, inverse = np.unique(keys, return_inverse=True)
+        entries = [self.entry(int(key)) for key in unique]
+        Q = np.stack([entry[0] for entry in entries])[inverse]
+        factor = np.stack([entry[1] for entry in entries])[inverse]
+        return Q, factor
+
+#default variance of the commanded (vx, vy, omega), the filters use it when they are not given a process noise model
+#without any process noise the predicted velocity covariance collapses, the UKF Cholesky fails and the gain goes to zero
+INPUT_NOISE = [0.01, 0.01, 0.01]
+DEFAULT_INPUT_COV = np.diag(INPUT_NOISE)
+
+def default_process_noise(process_noise=None):
+    #an empty Process_Noise() runs a filter without any process noise
+    return Process_Noise(input_cov=DEFAULT_INPUT_COV) if process_noise is None else process_noise
+
+def process_noise_model(process_noise=None, input_noise=INPUT_NOISE, dt_resolution=1e-4):
+    #Process_Noise from the diagonal parameter lists of the nodes and tools, without any noise when both are empty
+    return Process_Noise(Q=np.diag(process_noise) if process_noise else None,
+                         input_cov=np.diag(input_noise) if input_noise else None, dt_resolution=dt_resolution)
+
+def prediction_noise(process_noise, noise_estimator, state, dt):
+    #(input_cov, input_sqrt, noise) of a prediction from state over dt, noise is the additive (Q, factor) or None
+    #the adaptive estimate stands for all process noise once it is available, the input noise included, so the input is
+    #not augmented any more, it changes every step so its factor is left as None
+    #the estimator is told about the noise of every prediction so the next update is matched against it
+    if noise_estimator is not None:
+        Q = noise_estimator.process_cov(dt)
+        if Q is not None:
+            noise_estimator.advance(dt, Q)
+            return None, None, (Q, None)
+    input_cov = None if process_noise is None else process_noise.input_cov
+    input_sqrt = None if process_noise is None else process_noise.input_sqrt
+    noise = None if process_noise is None else process_noise.additive(dt)
+    if noise_estimator is not None:
+        #the input noise reaches the state through the input Jacobian, to first order
+        used = np.zeros((len(state), len(state))) if noise is None else noise[0]
+        if input_cov is not None:
+            used = used + propagate_covariance(input_cov, input_jacobian(state, dt))
+        noise_estimator.advance(dt, used)
+    return input_cov, input_sqrt, noise
+
+def augmented_sqrt(cov_sqrt, noise_sqrt):
+    #block diagonal factor of the state augmented with noise dimensions, cov_sqrt can be a (N, n, n) stack
+    n = cov_sqrt.shape[-1]
+    p = noise_sqrt.shape[-1]
+    S = np.zeros(cov_sqrt.shape[:-2] + (n + p, n + p))
+    S[..., :n, :n] = cov_sqrt
+    S[..., n:, n:] = noise_sqrt
+    return S
+
+class Measurement_Model:
+    #linear measurement model mapping the state to the IMU yaw rate and the four wheel velocities (fl, fr, rl, rr)
+    #it only depends on the wheel geometry so it is built once and rebuilt only when the geometry changes
+    def __init__(self, wheel_radius=0.0762, wheel_pair_separation=0.488, wheel_separation=0.44715, wheel_width=0.05):
+        self.rebuild(wheel_radius, wheel_pair_separation, wheel_separation, wheel_width)
+
+    def rebuild(self, wheel_radius=None, wheel_pair_separation=None, wheel_separation=None, wheel_width=None):
+        #geometry that is not given keeps its current value
+        if wheel_radius is not None:
+            self.wheel_radius = float(wheel_radius)
+        if wheel_pair_separation is not None:
+            self.wheel_pair_separation = float(wheel_pair_separation)
+        if wheel_separation is not None:
+            self.wheel_separation = float(wheel_separation)
+        if wheel_width is not None:
+            self.wheel_width = float(wheel_width)
+
+        b = 0.5*(self.wheel_separation + self.wheel_width)
+        a = 0.5*(self.wheel_radius + self.wheel_pair_separation)
+        self.roller_wheel_effect = (a+b)/self.wheel_radius
+
+        C = np.zeros((5,6))
+
+        C[0, 5] = 1
+        C[1:, 3] = 1/self.wheel_radius
+        C[1:, 4] = 1/self.wheel_radius
+        C[1:, 5] = self.roller_wheel_effect
+        C[1, 4] = -1*C[1,4]
+        C[4,4] = -1*C[4,4]
+        C[1,5] = -1*C[1,5]
+        C[3,5] = -1*C[3,5]
+
+        C.flags.writeable = False
+        self.C = C
+        self.C_T = C.T
+        #sub-blocks of C for single sensor updates, filled on first use
+        self.row_blocks = {}
+
+    def block(self, rows=None):
+        #measurement matrix and its transpose for a subset of the rows, the whole model when rows is None
+        if rows is None:
+            return self.C, self.C_T
+        key = (rows.start, rows.stop, rows.step)
+        if key not in self.row_blocks:
+            C = np.ascontiguousarray(self.C[rows])
+            C.flags.writeable = False
+            self.row_blocks[key] = (C, C.T)
+        return self.row_blocks[key]
+
+    def measure(self, state, rows=None):
+        #predicted measurement h(x) of the given rows, C x for this model
+        return self.block(rows)[0]@state
+
+    def jacobian(self, state, rows=None):
+        #measurement Jacobian H(x) of the given rows, the constant C for this model
+        return self.block(rows)[0]
+
+class UKF:
+    #unscented kalman filter for the mecanum base, holds the state and covariance between steps
+    def __init__(self, state=None, state_cov=None, params=None, measurement_model=None, square_root=False, joseph_form=True,
+                 process_noise=None, noise_estimator=None):
+        self.params = UKF_Parameters() if params is None else params
+        self.measurement_model = Measurement_Model() if measurement_model is None else measurement_model
+        self.square_root = square_root
+        self.joseph_form = joseph_form
+        #Process_Noise model, the default cmd_vel noise when none is given, and an optional Noise_Estimator that adapts R and Q online
+        self.process_noise = default_process_noise(process_noise)
+        self.noise_estimator = noise_estimator
+        self.reset(state, state_cov)
+
+    def reset(self, state=None, state_cov=None, state_sqrt=None):
+        n = self.params.n
+        self.state = np.zeros(n) if state is None else np.array(state, dtype=np.float64)
+        #the square root mode carries the covariance factor directly so no refactorisation is needed
+        if self.square_root and state_sqrt is not None:
+            self.state_sqrt = np.array(state_sqrt, dtype=np.float64)
+            self.state_cov = self.state_sqrt@self.state_sqrt.T
+            return
+        self.state_cov = 0.1*np.eye(n) if state_cov is None else np.array(state_cov, dtype=np.float64)
+        self.state_sqrt = np.linalg.cholesky(self.state_cov) if self.square_root else None
+
+    def predict(self, u, dt):
+        #need to define the sigma points that will be used to reconstuct predicted mean and covariance
+        if self.square_root:
+            cov_sqrt = self.state_sqrt
+        else:
+            cov_sqrt = np.linalg.cholesky(self.state_cov)
+        _, input_sqrt, noise = prediction_noise(self.process_noise, self.noise_estimator, self.state, dt)
+        central = self.params.central
+        if input_sqrt is None:
+            params = self.params
+            sigma = sigma_points(self.state, cov_sqrt, params.scale, central)
+            #propagate every sigma point through the motion model at once
+            sigma_pred = motion_model(sigma, u, dt)
+        else:
+            #the cmd_vel noise is appended to the state so its sigma points pass through the nonlinear motion model too
+            n = self.params.n
+            params = self.params.augmented(len(input_sqrt))
+            augmented = sigma_points(np.concatenate((self.state, np.zeros(len(input_sqrt)))),
+                                     augmented_sqrt(cov_sqrt, input_sqrt), params.scale, central)
+            sigma = augmented[:, :n]
+            sigma_pred = motion_model(sigma, np.asarray(u, dtype=np.float64) + augmented[:, n:], dt)
+
+        prior_state = self.state
+        self.state = params.mean_weights@sigma_pred
+        #deviations from the weighted means, so the central covariance weight and with it beta take effect
+        distance = sigma_pred - self.state
+        prior_distance = sigma - prior_state
+        #cross covariance between the current and the predicted state, kept for the RTS smoother
+        self.cross_cov = (params.cov_weights[:, None]*prior_distance).T@distance
+        if self.square_root:
+            noise_sqrt = None
+            if noise is not None:
+                Q, Q_sqrt = noise
+                noise_sqrt = psd_sqrt(Q) if Q_sqrt is None else Q_sqrt
+            self.state_sqrt = sigma_sqrt(distance, params.cov_weights, noise_sqrt, central)
+            self.state_cov = self.state_sqrt@self.state_sqrt.T
+        else:
+            self.state_cov = (params.cov_weights[:, None]*distance).T@distance
+            if noise is not None:
+                self.state_cov = self.state_cov + noise[0]
+        return self.state, self.state_cov
+
+    def update(self, z, z_cov, rows=None):
+        #the measurement model is linear so will use the regular kalman filter equations for the measurement
+        #rows restricts the update to the part of the measurement one sensor produces, e.g. IMU_ROWS
+        C, C_T = self.measurement_model.block(rows)
+        pred_state, pred_cov = self.state, self.state_cov
+        if self.noise_estimator is not None:
+            z_cov = self.noise_estimator.measurement_cov(z_cov, rows)
+        if self.square_root:
+            self.state, self.state_sqrt = sqrt_kalman_update(self.state, self.state_sqrt, z, np.linalg.cholesky(z_cov), C)
+            self.state_cov = self.state_sqrt@self.state_sqrt.T
+        else:
+            self.state, self.state_cov = kalman_update(self.state, self.state_cov, z, z_cov, C, C_T, self.joseph_form)
+        if self.noise_estimator is not None:
+            self.noise_estimator.record(C, z, pred_state, pred_cov, self.state, self.state_cov, rows)
+        return self.state, self.state_cov
+
+    def step(self, u, dt, z, z_cov):
+        self.predict(u, dt)
+        return self.update(z, z_cov)
+
+class Augmented_UKF(UKF):
+    #UKF on the state augmented with the cmd_vel noise and the measurement noise, e.g. 2*(6+3+5)+1 = 29 sigma points
+    #the sigma points drawn in predict are carried into the update so the noise enters through the models themselves
+    #the measurement noise dimensions are whitened, so the noise columns of the sigma set are constant and built once
+    #and only the state columns are filled in every step, the full covariance is carried
+    def __init__(self, state=None, state_cov=None, params=None, measurement_model=None, joseph_form=True,
+                 process_noise=None, noise_estimator=None):
+        self.noise_params = None
+        UKF.__init__(self, state, state_cov, params, measurement_model, False, joseph_form, process_noise, noise_estimator)
+
+    def reset(self, state=None, state_cov=None, state_sqrt=None):
+        UKF.reset(self, state, state_cov)
+        self.sigma_pred = None
+
+    def noise_sigma(self, input_sqrt):
+        #augmented weight tables and the constant noise columns of the sigma set, rebuilt only when the parameters or input noise change
+        p = 0 if input_sqrt is None else len(input_sqrt)
+        m = self.measurement_model.C.shape[0]
+        params = self.params.augmented(p + m)
+        if self.noise_params is not params or self.noise_input_sqrt is not input_sqrt:
+            noise_sqrt = np.eye(p + m)
+            if input_sqrt is not None:
+                noise_sqrt[:p, :p] = input_sqrt
+            n = self.params.n
+            self.noise_columns = sigma_points(np.zeros(n + p + m), augmented_sqrt(np.zeros((n, n)), noise_sqrt), params.scale,
+                                              params.central)[:, n:]
+            self.noise_params = params
+            self.noise_input_sqrt = input_sqrt
+        return params, self.noise_columns, p
+
+    def predict(self, u, dt):
+        n = self.params.n
+        _, input_sqrt, noise = prediction_noise(self.process_noise, self.noise_estimator, self.state, dt)
+        params, noise_columns, p = self.noise_sigma(input_sqrt)
+        n_a = len(noise_columns[0]) + n
+
+        #state columns of the augmented sigma set, the noise dimensions have zero mean and no correlation with the state
+        first = 1 if params.central else 0
+        spread = params.scale*np.linalg.cholesky(self.state_cov).T
+        sigma = np.tile(self.state, (len(params.mean_weights), 1))
+        sigma[first:n+first] += spread
+        sigma[n_a+first:n_a+n+first] -= spread
+
+        u = np.asarray(u, dtype=np.float64)
+        sigma_pred = motion_model(sigma, u + noise_columns[:, :p] if p else u, dt)
+
+        prior_state = self.state
+        self.state = params.mean_weights@sigma_pred
+        distance = sigma_pred - self.state
+        self.cross_cov = (params.cov_weights[:, None]*(sigma - prior_state)).T@distance
+        self.state_cov = (params.cov_weights[:, None]*distance).T@distance
+        #additive noise does not pass through the sigma points, the update accounts for it explicitly
+        self.additive_cov = None if noise is None else noise[0]
+        if self.additive_cov is not None:
+            self.state_cov = self.state_cov + self.additive_cov
+        self.sigma_pred = sigma_pred
+        return self.state, self.state_cov
+
+    def update(self, z, z_cov, rows=None):
+        #a second update after the same prediction has no propagated sigma points left, it uses the linear update instead
+        if self.sigma_pred is None:
+            return UKF.update(self, z, z_cov, rows)
+        #the same sigma set as the prediction
+        params, noise_columns, p = self.noise_sigma(self.noise_input_sqrt)
+        C, C_T = self.measurement_model.block(rows)
+        pred_state, pred_cov = self.state, self.state_cov
+        if self.noise_estimator is not None:
+            z_cov = self.noise_estimator.measurement_cov(z_cov, rows)
+
+        #whitened measurement noise columns scaled by this measurement's noise factor
+        measurement_noise = noise_columns[:, p:][:, slice(None) if rows is None else rows]
+        sigma_z = self.sigma_pred@C_T + measurement_noise@np.linalg.cholesky(z_cov).T
+        z_pred = params.mean_weights@sigma_z
+
+        distance = self.sigma_pred - self.state
+        z_distance = sigma_z - z_pred
+        innovation_cov = (params.cov_weights[:, None]*z_distance).T@z_distance
+        cross_cov = (params.cov_weights[:, None]*distance).T@z_distance
+        if self.additive_cov is not None:
+            innovation_cov = innovation_cov + C@self.additive_cov@C_T
+            cross_cov = cross_cov + self.additive_cov@C_T
+
+        L = np.linalg.cholesky(innovation_cov)
+        K = cholesky_solve(L, cross_cov.T).T
+        self.state = self.state + K@(z - z_pred)
+        state_cov = self.state_cov - K@innovation_cov@K.T
+        self.state_cov = 0.5*(state_cov + state_cov.T)
+        self.sigma_pred = None
+
+        if self.noise_estimator is not None:
+            self.noise_estimator.record(C, z, pred_state, pred_cov, self.state, self.state_cov, rows)
+        return self.state, self.state_cov
+
+class EKF:
+    #extended kalman filter with the same models, kept to compare against the UKF
+    def __init__(self, state=None, state_cov=None, measurement_model=None, joseph_form=True, process_noise=None, noise_estimator=None):
+        self.measurement_model = Measurement_Model() if measurement_model is None else measurement_model
+        self.joseph_form = joseph_form
+        self.process_noise = default_process_noise(process_noise)
+        self.noise_estimator = noise_estimator
+        self.reset(state, state_cov)
+
+    def reset(self, state=None, state_cov=None):
+        self.state = np.zeros(6) if state is None else np.array(state, dtype=np.float64)
+        self.state_cov = 0.1*np.eye(6) if state_cov is None else np.array(state_cov, dtype=np.float64)
+
+    def predict(self, u, dt):
+        #the motion model plus one Jacobian to carry the covariance forward
+        state = self.state
+        input_cov, _, noise = prediction_noise(self.process_noise, self.noise_estimator, state, dt)
+        Gx = motion_jacobian(state, u, dt)
+        self.state = motion_model(state, u, dt)
+        #cross covariance between the current and the predicted state, kept for the RTS smoother
+        self.cross_cov = self.state_cov@Gx.T
+        self.state_cov = propagate_covariance(self.state_cov, Gx)
+        if input_cov is not None:
+            #input covariance through the input Jacobian, taken about the state the command was applied to
+            self.state_cov = self.state_cov + propagate_covariance(input_cov, input_jacobian(state, dt))
+        if noise is not None:
+            self.state_cov = self.state_cov + noise[0]
+        return self.state, self.state_cov
+
+    def update(self, z, z_cov, rows=None):
+        C, C_T = self.measurement_model.block(rows)
+        pred_state, pred_cov = self.state, self.state_cov
+        if self.noise_estimator is not None:
+            z_cov = self.noise_estimator.measurement_cov(z_cov, rows)
+        self.state, self.state_cov = kalman_update(self.state, self.state_cov, z, z_cov, C, C_T, self.joseph_form)
+        if self.noise_estimator is not None:
+            self.noise_estimator.record(C, z, pred_state, pred_cov, self.state, self.state_cov, rows)
+        return self.state, self.state_cov
+
+    def step(self, u, dt, z, z_cov):
+        self.predict(u, dt)
+        return self.update(z, z_cov)
+
+class Iterated_EKF(EKF):
+    #EKF whose measurement update is repeated about the latest iterate until it stops moving, a Gauss-Newton step on the posterior
+    #measurement_function(state, rows) and measurement_jacobian(state, rows) give h(x) and H(x) of the measured rows and are
+    #evaluated again at every iterate, they default to the linear wheel and IMU model which settles after one pass
+    def __init__(self, state=None, state_cov=None, measurement_model=None, joseph_form=True, process_noise=None, noise_estimator=None,
+                 iterations=5, tolerance=1e-9, measurement_function=None, measurement_jacobian=None):
+        self.iterations = iterations
+        self.tolerance = tolerance
+        EKF.__init__(self, state, state_cov, measurement_model, joseph_form, process_noise, noise_estimator)
+        self.measurement_function = self.measurement_model.measure if measurement_function is None else measurement_function
+        self.measurement_jacobian = self.measurement_model.jacobian if measurement_jacobian is None else measurement_jacobian
+
+    def update(self, z, z_cov, rows=None):
+        pred_state, pred_cov = self.state, self.state_cov
+        if self.noise_estimator is not None:
+            z_cov = self.noise_estimator.measurement_cov(z_cov, rows)
+
+        state = pred_state
+        for _ in range(self.iterations):
+            #measurement and Jacobian relinearised about the current iterate
+            C = self.measurement_jacobian(state, rows)
+            PC_T = pred_cov@C.T
+            K = cholesky_solve(np.linalg.cholesky(C@PC_T + z_cov), PC_T.T).T
+            next_state = pred_state + K@(z - self.measurement_function(state, rows) - C@(pred_state - state))
+            converged = np.max(np.abs(next_state - state)) < self.tolerance
+            state = next_state
+            if converged:
+                break
+
+        #covariance and the noise statistics use the linearisation of the last iterate
+        I_KC = np.eye(len(state)) - K@C
+        if self.joseph_form:
+            state_cov = I_KC@pred_cov@I_KC.T + K@z_cov@K.T
+        else:
+            state_cov = I_KC@pred_cov
+        self.state = state
+        self.state_cov = 0.5*(state_cov + state_cov.T)
+        if self.noise_estimator is not None:
+            self.noise_estimator.record(C, z, pred_state, pred_cov, self.state, self.state_cov, rows)
+        return self.state, self.state_cov
+
+def rts_gain(cross_cov, pred_cov):
+    #smoother gain D P^-1, the predicted covariance can be singular in the velocity block so the pseudo inverse is used
+    return cross_cov@np.linalg.pinv(pred_cov, hermitian=True)
+
+def rts_step(state, state_cov, pred_state, pred_cov, gain, smoothed_state, smoothed_cov):
+    #one backward Rauch-Tung-Striebel step from the smoothed estimate of the next time to this one
+    state = state + gain@(smoothed_state - pred_state)
+    state_cov = state_cov + gain@(smoothed_cov - pred_cov)@gain.T
+    return state, state_cov
+
+def rts_smooth(states, state_covs, pred_states, pred_covs, cross_covs):
+    #full backward RTS pass over a whole forward run, entry k of the pred and cross arrays is the prediction from k-1 into k
+    #the gains of every step come from one batched pseudo inverse, only the recursion itself runs step by step
+    gains = cross_covs[1:]@np.linalg.pinv(pred_covs[1:], hermitian=True)
+
+    smoothed_states = np.empty_like(states)
+    smoothed_covs = np.empty_like(state_covs)
+    smoothed_states[-1] = states[-1]
+    smoothed_covs[-1] = state_covs[-1]
+    for k in range(len(states) - 2, -1, -1):
+        smoothed_states[k], smoothed_covs[k] = rts_step(states[k], state_covs[k], pred_states[k+1], pred_covs[k+1],
+                                                         gains[k], smoothed_states[k+1], smoothed_covs[k+1])
+    return smoothed_states, smoothed_covs, gains
+
+class State_History:
+    #fixed capacity ring buffer of past filter steps, preallocated so appending never allocates
+    #every entry holds the time, the input applied over the interval ending at that time, the measurement applied at that time
+    #and the posterior state and covariance after it
+    def __init__(self, capacity=100, n=6, m=5, p=3, square_root=False, smoothing=False, snapshots=False):
+        self.capacity = capacity
+        self.times = np.empty(capacity)
+        self.states = np.empty((capacity, n))
+        self.state_covs = np.empty((capacity, n, n))
+        #prediction into each entry and the RTS gain back to the entry before it, only kept when smoothing
+        self.pred_states = np.empty((capacity, n)) if smoothing else None
+        self.pred_covs = np.empty((capacity, n, n)) if smoothing else None
+        self.gains = np.empty((capacity, n, n)) if smoothing else None
+        #smoothed estimate of each entry given everything up to the newest one and the product of the RTS gains from it to the newest
+        self.smoothed_states = np.empty((capacity, n)) if smoothing else None
+        self.smoothed_covs = np.empty((capacity, n, n)) if smoothing else None
+        self.gain_products = np.empty((capacity, n, n)) if smoothing else None
+        #covariance factors of a square root UKF, restored as they are so a rewind never refactorises
+        self.state_sqrts = np.empty((capacity, n, n)) if square_root else None
+        #full internal state of filters that are more than one Gaussian, such as the model bank of the IMM
+        self.snapshots = [None]*capacity if snapshots else None
+        self.inputs = np.empty((capacity, p))
+        self.measurements = np.zeros((capacity, m))
+        self.measurement_covs = np.zeros((capacity, m, m))
+        #measurement rows applied at each entry as [start, stop), start == stop for a pure prediction
+        self.row_bounds = np.zeros((capacity, 2), dtype=np.int64)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def slot(self, i):
+        #ring position of the i-th oldest entry
+        return (self.start + i) % self.capacity
+
+    def latest_time(self):
+        return self.times[self.slot(self.size - 1)]
+
+    def append(self, t, state, state_cov, u, z=None, z_cov=None, rows=None, state_sqrt=None, pred_state=None, pred_cov=None, gain=None,
+               snapshot=None):
+        #O(1), the oldest entry is overwritten once the buffer is full
+        if self.size == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+        i = self.slot(self.size)
+        self.size += 1
+
+        self.times[i] = t
+        self.states[i] = state
+        self.state_covs[i] = state_cov
+        if self.state_sqrts is not None:
+            self.state_sqrts[i] = state_sqrt
+        if self.snapshots is not None:
+            self.snapshots[i] = snapshot
+        if self.gains is not None:
+            self.pred_states[i] = pred_state
+            self.pred_covs[i] = pred_cov
+            self.gains[i] = gain
+        self.inputs[i] = u
+        if z is None:
+            self.row_bounds[i] = 0
+        else:
+            rows = slice(0, self.measurements.shape[1]) if rows is None else rows
+            self.measurements[i, rows] = z
+            self.measurement_covs[i, rows, rows] = z_cov
+            self.row_bounds[i] = rows.start, rows.stop
+
+    def find(self, t):
+        #logical index of the newest entry at or before t, -1 when t is older than the whole history
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi)//2
+            if self.times[self.slot(mid)] <= t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def entry(self, i):
+        #time, input and measurement of the i-th oldest entry, the measurement parts are None for a pure prediction
+        j = self.slot(i)
+        start, stop = self.row_bounds[j]
+        if start == stop:
+            return self.times[j], self.inputs[j].copy(), None, None, None
+        rows = slice(int(start), int(stop))
+        return self.times[j], self.inputs[j].copy(), self.measurements[j, rows].copy(), self.measurement_covs[j, rows, rows].copy(), rows
+
+    def truncate(self, size):
+        #drop every entry newer than the first size entries
+        self.size = size
+
+    def extend_smoothing(self, lag):
+        #fold the newest entry into the smoothed estimates of the lag entries before it
+        #with B = G_j ... G_k-1 the gain product of entry j, the new entry moves its estimate by B (x_k - x_k_pred) and its
+        #covariance by B (P_k - P_k_pred) B^T, so a step is the same few stacked operations whatever the lag
+        i = self.slot(self.size - 1)
+        self.smoothed_states[i] = self.states[i]
+        self.smoothed_covs[i] = self.state_covs[i]
+        self.gain_products[i] = np.eye(self.states.shape[1])
+        lag = min(lag, self.size - 1)
+        if lag == 0:
+            return
+        window = (self.start + np.arange(self.size - 1 - lag, self.size - 1)) % self.capacity
+        products = self.gain_products[window]@self.gains[i]
+        self.gain_products[window] = products
+        self.smoothed_states[window] += products@(self.states[i] - self.pred_states[i])
+        self.smoothed_covs[window] += products@(self.state_covs[i] - self.pred_covs[i])@np.swapaxes(products, -1, -2)
+
+    def restart_smoothing(self, lag):
+        #backward RTS pass over the newest lag entries, rebuilding their smoothed estimates and gain products
+        #after a rewind dropped the entries they were conditioned on
+        if self.size == 0:
+            return
+        i = self.slot(self.size - 1)
+        state, state_cov, product = self.states[i], self.state_covs[i], np.eye(self.states.shape[1])
+        self.smoothed_states[i], self.smoothed_covs[i], self.gain_products[i] = state, state_cov, product
+        for k in range(self.size - 1, max(self.size - 1 - lag, 0), -1):
+            i, j = self.slot(k), self.slot(k - 1)
+            product = self.gains[i]@product
+            state, state_cov = rts_step(self.states[j], self.state_covs[j], self.pred_states[i], self.pred_covs[i],
+                                        self.gains[i], state, state_cov)
+            self.smoothed_states[j], self.smoothed_covs[j], self.gain_products[j] = state, state_cov, product
+
+class History_Filter:
+    #wraps a UKF or EKF with a State_History so measurements that arrive late are inserted at their true time
+    #and the filter is re-propagated forward over the newer entries
+    #with a smoother lag every step also refines the estimates of the lag entries before it, a fixed-lag RTS smoother
+    #filters with a snapshot() and restore(snapshot) pair are rewound to their full internal state instead of the Gaussian
+    def __init__(self, filter, capacity=100, smoother_lag=0):
+        self.filter = filter
+        n = len(filter.state)
+        self.square_root = getattr(filter, 'square_root', False)
+        self.snapshots = hasattr(filter, 'snapshot')
+        self.smoother_lag = smoother_lag
+        self.smoothing = smoother_lag > 0
+        self.history = State_History(capacity, n=n, m=filter.measurement_model.C.shape[0], square_root=self.square_root, smoothing=self.smoothing,
+                                     snapshots=self.snapshots)
+        #command held for events that do not bring their own input
+        self.command = np.zeros(3)
+
+    def set_command(self, u):
+        self.command = np.asarray(u, dtype=np.float64)
+
+    def process(self, t, z=None, z_cov=None, rows=None, u=None):
+        #predict to t and apply the measurement, u is the input over the interval ending at t
+        #when u is None the held command is used, or the recorded input of the interval a late measurement falls in
+        #returns False when t is older than everything in the history and the measurement has to be dropped
+        history = self.history
+        if len(history) == 0 or t >= history.latest_time():
+            self.apply(t, self.command if u is None else u, z, z_cov, rows)
+            return True
+
+        k = history.find(t)
+        if k < 0:
+            return False
+
+        #pull out the newer entries, restart from the entry before the late measurement and replay them in order
+        later = [history.entry(i) for i in range(k + 1, len(history))]
+        j = history.slot(k)
+        if self.snapshots:
+            self.filter.restore(history.snapshots[j])
+        elif self.square_root:
+            self.filter.reset(history.states[j], state_sqrt=history.state_sqrts[j])
+        else:
+            self.filter.reset(history.states[j], history.state_covs[j])
+        history.truncate(k + 1)
+        if self.smoothing:
+            history.restart_smoothing(self.smoother_lag)
+
+        self.apply(t, later[0][1] if u is None else u, z, z_cov, rows)
+        for entry in later:
+            self.apply(*entry)
+        return True
+
+    def apply(self, t, u, z, z_cov, rows):
+        pred_state = pred_cov = gain = None
+        predicted = False
+        if len(self.history):
+            dt = t - self.history.latest_time()
+            if dt > 0:
+                self.filter.predict(u, dt)
+                predicted = True
+        if self.smoothing:
+            if predicted:
+                pred_state, pred_cov = self.filter.state.copy(), self.filter.state_cov.copy()
+                gain = rts_gain(self.filter.cross_cov, pred_cov)
+            else:
+                #no time passed since the previous entry, the transition is the identity
+                pred_state, pred_cov = self.filter.state.copy(), self.filter.state_cov.copy()
+                gain = np.eye(len(pred_state))
+        if z is not None:
+            self.filter.update(z, z_cov, rows)
+        self.history.append(t, self.filter.state, self.filter.state_cov, u, z, z_cov, rows,
+                            self.filter.state_sqrt if self.square_root else None,
+                            pred_state, pred_cov, gain, self.filter.snapshot() if self.snapshots else None)
+        if self.smoothing:
+            self.history.extend_smoothing(self.smoother_lag)
+
+    def smooth(self):
+        #time, smoothed state and covariance of the entry smoother_lag steps behind the newest one, kept up to date by every step
+        history = self.history
+        i = history.slot(len(history) - 1 - min(self.smoother_lag, len(history) - 1))
+        return history.times[i], history.smoothed_states[i].copy(), history.smoothed_covs[i].copy()
+
+    def latest_time(self):
+        return self.history.latest_time()
+
+def batch_sigma_points(states, cov_sqrts, scale, central=True):
+    #sigma points for a stack of filters, states is (N, n) and cov_sqrts is (N, n, n), the result is (N, 2n+1, n) or (N, 2n, n)
+    N, n = states.shape
+    first = 1 if central else 0
+    spread = scale*np.swapaxes(cov_sqrts, -1, -2)
+    sigma = np.empty((N, 2*n+first, n))
+    sigma[:, 0] = states
+    sigma[:, first:n+first] = states[:, None, :] + spread
+    sigma[:, n+first:] = states[:, None, :] - spread
+    return sigma
+
+def batch_kalman_update(pred_states, pred_covs, z, z_cov, C, C_T, joseph_form=True):
+    #kalman_update for a stack of filters, z is (N, m) and z_cov is (m, m) or (N, m, m)
+    #C is one shared (m, n) measurement matrix or a (N, m, n) stack with C_T its transposes
+    PC_T = pred_covs@C_T
+    innovation_cov = C@PC_T + z_cov
+    L = np.linalg.cholesky(innovation_cov)
+
+    K = np.swapaxes(cholesky_solve(L, np.swapaxes(PC_T, -1, -2)), -1, -2)
+    innovation = z - (C@pred_states[..., None])[..., 0]
+    states = pred_states + np.einsum('nij,nj->ni', K, innovation)
+
+    I_KC = np.eye(pred_states.shape[-1]) - K@C
+    if joseph_form:
+        state_covs = I_KC@pred_covs@np.swapaxes(I_KC, -1, -2) + K@z_cov@np.swapaxes(K, -1, -2)
+    else:
+        state_covs = I_KC@pred_covs
+    state_covs = 0.5*(state_covs + np.swapaxes(state_covs, -1, -2))
+    return states, state_covs
+
+def batch_sqrt_kalman_update(pred_states, pred_sqrts, z, z_sqrt, C, C_T):
+    #sqrt_kalman_update for a stack of filters, z_sqrt is (m, m) or (N, m, m) and C is shared or stacked as in batch_kalman_update
+    CS = C@pred_sqrts
+    z_sqrt = np.broadcast_to(z_sqrt, CS.shape[:-1] + z_sqrt.shape[-1:])
+    innovation_sqrt = qr_factor(np.swapaxes(np.concatenate((CS, z_sqrt), axis=-1), -1, -2))
+
+    K = np.swapaxes(cholesky_solve(innovation_sqrt, CS@np.swapaxes(pred_sqrts, -1, -2)), -1, -2)
+    innovation = z - (C@pred_states[..., None])[..., 0]
+    states = pred_states + np.einsum('nij,nj->ni', K, innovation)
+
+    I_KC = np.eye(pred_states.shape[-1]) - K@C
+    state_sqrts = qr_factor(np.swapaxes(np.concatenate((I_KC@pred_sqrts, K@z_sqrt), axis=-1), -1, -2))
+    return states, state_sqrts
+
+def batch_motion_jacobian(states, u, dt):
+    #motion_jacobian for a stack of states, u is (3,) or (N, 3) and dt is a scalar or (N,)
+    u = np.asarray(u, dtype=np.float64)
+    vx = u[..., 0]
+    vy = u[..., 1]
+    cos_theta = np.cos(states[:, 2])
+    sin_theta = np.sin(states[:, 2])
+
+    Gx = np.tile(np.eye(6), (len(states), 1, 1))
+    Gx[:, 0, 2] = -(vx*sin_theta + vy*cos_theta)*dt
+    Gx[:, 0, 3] = dt*cos_theta
+    Gx[:, 0, 4] = -dt*sin_theta
+    Gx[:, 1, 2] = (vx*cos_theta - vy*sin_theta)*dt
+    Gx[:, 1, 3] = dt*sin_theta
+    Gx[:, 1, 4] = dt*cos_theta
+    Gx[:, 2, 5] = dt
+    return Gx
+
+class Batch_UKF:
+    #N independent UKFs held as stacked (N, 6) states and (N, 6, 6) covariances
+    #every predict and update advances all of them, or a chosen subset, with one set of array operations
+    def __init__(self, N, states=None, state_covs=None, params=None, measurement_model=None, square_root=False, joseph_form=True,
+                 process_noise=None):
+        self.N = N
+        self.params = UKF_Parameters() if params is None else params
+        self.measurement_model = Measurement_Model() if measurement_model is None else measurement_model
+        self.square_root = square_root
+        self.joseph_form = joseph_form
+        self.process_noise = default_process_noise(process_noise)
+        self.reset(states, state_covs)
+
+    def reset(self, states=None, state_covs=None):
+        n = self.params.n
+        if states is None:
+            self.states = np.zeros((self.N, n))
+        else:
+            self.states = np.array(np.broadcast_to(states, (self.N, n)), dtype=np.float64)
+        if state_covs is None:
+            self.state_covs = np.tile(0.1*np.eye(n), (self.N, 1, 1))
+        else:
+            self.state_covs = np.array(np.broadcast_to(state_covs, (self.N, n, n)), dtype=np.float64)
+        #stacked covariance factors of the square root mode
+        self.state_sqrts = np.linalg.cholesky(self.state_covs) if self.square_root else None
+        #cross covariances between the states before and after the latest prediction
+        self.cross_covs = np.zeros((self.N, n, n))
+
+    def predict(self, u, dt, index=None):
+        #u is (3,) or (N, 3) and dt is a scalar or (N,), index selects the filters to advance, all of them by default
+        #the cmd_vel noise can be one (3, 3) covariance or a (N, 3, 3) stack with one per filter
+        sel = slice(None) if index is None else index
+        states = self.states[sel]
+        if self.square_root:
+            cov_sqrts = self.state_sqrts[sel]
+        else:
+            cov_sqrts = np.linalg.cholesky(self.state_covs[sel])
+
+        u = np.asarray(u, dtype=np.float64)
+        if u.ndim == 2:
+            u = u[:, None, :]
+        dt = np.asarray(dt, dtype=np.float64)
+        step_dt = dt[:, None] if dt.ndim == 1 else dt
+
+        input_sqrt = None if self.process_noise is None else self.process_noise.input_sqrt
+        n = self.params.n
+        if input_sqrt is None:
+            params = self.params
+            sigma = batch_sigma_points(states, cov_sqrts, params.scale, params.central)
+            sigma_pred = motion_model(sigma, u, step_dt)
+        else:
+            #same augmentation with the cmd_vel noise as the single UKF, the sigma tensor grows to (N, 2(n+3)+1, n+3)
+            if input_sqrt.ndim == 3:
+                input_sqrt = input_sqrt[sel]
+            p = input_sqrt.shape[-1]
+            params = self.params.augmented(p)
+            augmented = batch_sigma_points(np.concatenate((states, np.zeros((len(states), p))), axis=1),
+                                           augmented_sqrt(cov_sqrts, input_sqrt), params.scale, params.central)
+            sigma = augmented[..., :n]
+            sigma_pred = motion_model(sigma, u + augmented[..., n:], step_dt)
+
+        #same centring on the weighted means as the single UKF
+        mean = np.einsum('j,nji->ni', params.mean_weights, sigma_pred)
+        distance = sigma_pred - mean[:, None, :]
+        prior_distance = sigma - states[:, None, :]
+        self.cross_covs[sel] = np.einsum('j,nji,njk->nik', params.cov_weights, prior_distance, distance)
+        self.states[sel] = mean
+        noise = None if self.process_noise is None else self.process_noise.additive(dt)
+        if self.square_root:
+            state_sqrts = sigma_sqrt(distance, params.cov_weights, None if noise is None else noise[1], params.central)
+            self.state_sqrts[sel] = state_sqrts
+            self.state_covs[sel] = state_sqrts@np.swapaxes(state_sqrts, -1, -2)
+        else:
+            state_covs = np.einsum('j,nji,njk->nik', params.cov_weights, distance, distance)
+            if noise is not None:
+                state_covs += noise[0]
+            self.state_covs[sel] = state_covs
+        return self.states[sel], self.state_covs[sel]
+
+    def update(self, z, z_cov, index=None):
+        sel = slice(None) if index is None else index
+        C, C_T = self.measurement_model.C, self.measurement_model.C_T
+        if self.square_root:
+            states, state_sqrts = batch_sqrt_kalman_update(self.states[sel], self.state_sqrts[sel], z, np.linalg.cholesky(z_cov), C, C_T)
+            self.state_sqrts[sel] = state_sqrts
+            state_covs = state_sqrts@np.swapaxes(state_sqrts, -1, -2)
+        else:
+            states, state_covs = batch_kalman_update(self.states[sel], self.state_covs[sel], z, z_cov, C, C_T, self.joseph_form)
+        self.states[sel] = states
+        self.state_covs[sel] = state_covs
+        return states, state_covs
+
+    def step(self, u, dt, z, z_cov, index=None):
+        self.predict(u, dt, index)
+        return self.update(z, z_cov, index)
+
+class Batch_EKF:
+    #N independent EKFs held as stacked arrays, the batched counterpart of EKF for Monte Carlo studies
+    def __init__(self, N, states=None, state_covs=None, measurement_model=None, joseph_form=True, process_noise=None):
+        self.N = N
+        self.measurement_model = Measurement_Model() if measurement_model is None else measurement_model
+        self.joseph_form = joseph_form
+        self.process_noise = default_process_noise(process_noise)
+        self.reset(states, state_covs)
+
+    def reset(self, states=None, state_covs=None):
+        if states is None:
+            self.states = np.zeros((self.N, 6))
+        else:
+            self.states = np.array(np.broadcast_to(states, (self.N, 6)), dtype=np.float64)
+        if state_covs is None:
+            self.state_covs = np.tile(0.1*np.eye(6), (self.N, 1, 1))
+        else:
+            self.state_covs = np.array(np.broadcast_to(state_covs, (self.N, 6, 6)), dtype=np.float64)
+
+    def predict(self, u, dt, index=None):
+        sel = slice(None) if index is None else index
+        #copied because a slice is a view that the assignment below would overwrite before the input Jacobian is taken
+        states = np.array(self.states[sel])
+        Gx = batch_motion_jacobian(states, u, dt)
+        self.states[sel] = motion_model(states, u, np.asarray(dt, dtype=np.float64))
+        state_covs = Gx@self.state_covs[sel]@np.swapaxes(Gx, -1, -2)
+        if self.process_noise is not None:
+            if self.process_noise.input_cov is not None:
+                Gu = input_jacobian(states, dt)
+                state_covs += Gu@self.process_noise.input_cov@np.swapaxes(Gu, -1, -2)
+            noise = self.process_noise.additive(dt)
+            if noise is not None:
+                state_covs += noise[0]
+        self.state_covs[sel] = state_covs
+        return self.states[sel], self.state_covs[sel]
+
+    def update(self, z, z_cov, index=None):
+        sel = slice(None) if index is None else index
+        states, state_covs = batch_kalman_update(self.states[sel], self.state_covs[sel], z, z_cov,
+                                                 self.measurement_model.C, self.measurement_model.C_T, self.joseph_form)
+        self.states[sel] = states
+        self.state_covs[sel] = state_covs
+        return states, state_covs
+
+    def step(self, u, dt, z, z_cov, index=None):
+        self.predict(u, dt, index)
+        return self.update(z, z_cov, index)
+
+def systematic_resample(weights, rng):
+    #one uniform offset and N evenly spaced positions through the cumulative weights, O(N) and with low resampling variance
+    N = len(weights)
+    positions = (rng.random() + np.arange(N))/N
+    cumulative = np.cumsum(weights)
+    cumulative[-1] = 1.0
+    return np.searchsorted(cumulative, positions)
+
+class Particle_Filter:
+    #bootstrap particle filter over the same motion and measurement models, every step is a few array operations over all particles
+    #weights are kept as normalised logs, and resampling only happens when the effective sample size drops below
+    #resample_threshold times the number of particles
+    def __init__(self, state=None, state_cov=None, measurement_model=None, process_noise=None, particles=10000, resample_threshold=0.5,
+                 seed=None):
+        self.measurement_model = Measurement_Model() if measurement_model is None else measurement_model
+        self.process_noise = default_process_noise(process_noise)
+        self.N = particles
+        self.resample_threshold = resample_threshold
+        self.rng = np.random.default_rng(seed)
+        self.reset(state, state_cov)
+
+    def reset(self, state=None, state_cov=None):
+        #particles are drawn from the Gaussian, this is also how a rewind of the history restarts the filter
+        state = np.zeros(6) if state is None else np.array(state, dtype=np.float64)
+        state_cov = 0.1*np.eye(6) if state_cov is None else np.array(state_cov, dtype=np.float64)
+        self.particles = state + self.rng.standard_normal((self.N, 6))@psd_sqrt(state_cov).T
+        self.log_weights = np.full(self.N, -math.log(self.N))
+        self.effective_size = float(self.N)
+        self.estimate()
+
+    def estimate(self):
+        #weighted mean and covariance of the particles
+        weights = np.exp(self.log_weights)
+        self.state = weights@self.particles
+        distance = self.particles - self.state
+        self.state_cov = (weights[:, None]*distance).T@distance
+        return self.state, self.state_cov
+
+    def predict(self, u, dt):
+        prior, prior_state = self.particles, self.state
+        u = np.asarray(u, dtype=np.float64)
+        if self.process_noise.input_sqrt is not None:
+            u = u + self.rng.standard_normal((self.N, 3))@self.process_noise.input_sqrt.T
+        particles = motion_model(prior, u, dt)
+        noise = self.process_noise.additive(dt)
+        if noise is not None:
+            particles += self.rng.standard_normal((self.N, 6))@noise[1].T
+        self.particles = particles
+        self.estimate()
+        #cross covariance between the current and the predicted state, kept for the RTS smoother
+        self.cross_cov = (np.exp(self.log_weights)[:, None]*(prior - prior_state)).T@(particles - self.state)
+        return self.state, self.state_cov
+
+    def update(self, z, z_cov, rows=None):
+        C, C_T = self.measurement_model.block(rows)
+        #Gaussian log likelihood of every particle from residuals whitened by the Cholesky factor of the noise
+        residual = z - self.particles@C_T
+        whitened = np.linalg.solve(np.linalg.cholesky(z_cov), residual.T)
+        log_weights = self.log_weights - 0.5*np.einsum('ij,ij->j', whitened, whitened)
+        top = np.max(log_weights)
+        self.log_weights = log_weights - (top + math.log(np.sum(np.exp(log_weights - top))))
+
+        self.effective_size = 1/np.sum(np.exp(2*self.log_weights))
+        #the estimate is taken before resampling, which only adds noise to it
+        self.estimate()
+        if self.effective_size < self.resample_threshold*self.N:
+            index = systematic_resample(np.exp(self.log_weights), self.rng)
+            self.particles = self.particles[index]
+            self.log_weights = np.full(self.N, -math.log(self.N))
+        return self.state, self.state_cov
+
+    def step(self, u, dt, z, z_cov):
+        self.predict(u, dt)
+        return self.update(z, z_cov)
+
+class IMM:
+    #interacting multiple model filter over a small bank of UKFs that differ in their wheel noise, wheel slip and cmd_vel noise
+    #the bank is one Batch_UKF with a row per model, so mixing, prediction and the update of every model are stacked array operations
+    #model j scales the wheel variances by wheel_scales[j], reads the wheels 1 + slips[j] times faster than the body moves
+    #and scales the cmd_vel covariance by input_scales[j]
+    def __init__(self, state=None, state_cov=None, params=None, measurement_model=None, square_root=False, joseph_form=True,
+                 process_noise=None, wheel_scales=(1.0, 16.0), slips=(0.0, 0.1), input_scales=(1.0, 4.0), transition=None,
+                 mode_probabilities=None):
+        self.measurement_model = Measurement_Model() if measurement_model is None else measurement_model
+        self.M = M = len(wheel_scales)
+        if len(slips) != M or len(input_scales) != M:
+            raise ValueError("IMM needs one wheel scale, slip and input scale per model")
+
+        #Markov chain of the model switches, by default a model is kept with probability 0.95
+        if transition is None:
+            transition = np.full((M, M), 0.05/max(M - 1, 1)) + (0.95 - 0.05/max(M - 1, 1))*np.eye(M)
+        self.transition = np.array(transition, dtype=np.float64)
+        self.transition /= self.transition.sum(axis=1, keepdims=True)
+
+        #per model measurement matrices and the standard deviation scale of every measurement row
+        C = np.array(np.broadcast_to(self.measurement_model.C, (M,) + self.measurement_model.C.shape))
+        C[:, WHEEL_ROWS] *= 1 + np.asarray(slips, dtype=np.float64)[:, None, None]
+        self.C = C
+        self.noise_scales = np.ones((M, C.shape[1]))
+        self.noise_scales[:, WHEEL_ROWS] = np.sqrt(np.asarray(wheel_scales, dtype=np.float64))[:, None]
+
+        #stacked cmd_vel noise, the additive Q is shared by all models
+        process_noise = default_process_noise(process_noise)
+        input_cov = DEFAULT_INPUT_COV if process_noise.input_cov is None else process_noise.input_cov
+        input_covs = np.asarray(input_scales, dtype=np.float64)[:, None, None]*input_cov
+        self.bank = Batch_UKF(M, params=params, measurement_model=self.measurement_model, square_root=square_root, joseph_form=joseph_form,
+                              process_noise=Process_Noise(process_noise.Q, input_covs, process_noise.dt_resolution))
+        self.reset(state, state_cov, mode_probabilities)
+
+    def reset(self, state=None, state_cov=None, mode_probabilities=None):
+        #every model restarts from the given state, the mode probabilities are kept unless new ones are given
+        self.bank.reset(state, state_cov)
+        if mode_probabilities is not None:
+            self.mode_probabilities = np.array(mode_probabilities, dtype=np.float64)/np.sum(mode_probabilities)
+        elif not hasattr(self, 'mode_probabilities'):
+            self.mode_probabilities = np.full(self.M, 1/self.M)
+        self.combine()
+
+    def snapshot(self):
+        #model states, covariances and mode probabilities, everything a rewind of the history needs to restart the bank exactly
+        bank = self.bank
+        return (bank.states.copy(), bank.state_covs.copy(), None if bank.state_sqrts is None else bank.state_sqrts.copy(),
+                self.mode_probabilities.copy())
+
+    def restore(self, snapshot):
+        bank = self.bank
+        states, state_covs, state_sqrts, mode_probabilities = snapshot
+        bank.states, bank.state_covs = states.copy(), state_covs.copy()
+        bank.state_sqrts = None if state_sqrts is None else state_sqrts.copy()
+        self.mode_probabilities = mode_probabilities.copy()
+        self.combine()
+
+    def combine(self):
+        #moment matched mixture of the model estimates
+        states, state_covs = self.bank.states, self.bank.state_covs
+        self.state = self.mode_probabilities@states
+        distance = states - self.state
+        self.state_cov = np.einsum('j,jik->ik', self.mode_probabilities, state_covs + distance[:, :, None]*distance[:, None, :])
+        return self.state, self.state_cov
+
+    def predict(self, u, dt):
+        #mixing, every model starts from the mixture of all models weighted by the chance it was in each of them
+        bank = self.bank
+        predicted = self.mode_probabilities@self.transition
+        weights = self.transition*self.mode_probabilities[:, None]/predicted
+        prior_states = bank.states
+        states = weights.T@prior_states
+        distance = prior_states[:, None, :] - states[None, :, :]
+        state_covs = np.einsum('ij,ink->jnk', weights, bank.state_covs) + np.einsum('ij,ijn,ijk->jnk', weights, distance, distance)
+        bank.reset(states, 0.5*(state_covs + np.swapaxes(state_covs, -1, -2)))
+        self.mode_probabilities = predicted
+
+        prior_state = self.state
+        bank.predict(u, dt)
+        self.combine()
+        #cross covariance of the mixture, the model cross covariances plus the spread of the mixed and predicted means
+        spread = np.einsum('j,ji,jk->ik', predicted, states - prior_state, bank.states - self.state)
+        self.cross_cov = np.einsum('j,jik->ik', predicted, bank.cross_covs) + spread
+        return self.state, self.state_cov
+
+    def update(self, z, z_cov, rows=None):
+        bank = self.bank
+        rows = slice(None) if rows is None else rows
+        C = self.C[:, rows]
+        C_T = np.swapaxes(C, -1, -2)
+        scales = self.noise_scales[:, rows]
+        z_covs = scales[:, :, None]*z_cov*scales[:, None, :]
+
+        #Gaussian log likelihood of the innovation under every model, the shared 2 pi term is left out
+        innovation = z - (C@bank.states[..., None])[..., 0]
+        L = np.linalg.cholesky(C@bank.state_covs@C_T + z_covs)
+        solved = cholesky_solve(L, innovation[..., None])[..., 0]
+        log_likelihood = -0.5*np.einsum('ni,ni->n', innovation, solved) - np.sum(np.log(np.diagonal(L, axis1=-2, axis2=-1)), axis=1)
+        log_probabilities = np.log(self.mode_probabilities) + log_likelihood
+        probabilities = np.exp(log_probabilities - np.max(log_probabilities))
+        self.mode_probabilities = probabilities/np.sum(probabilities)
+
+        if bank.square_root:
+            states, bank.state_sqrts = batch_sqrt_kalman_update(bank.states, bank.state_sqrts, z, np.linalg.cholesky(z_covs), C, C_T)
+            bank.states, bank.state_covs = states, bank.state_sqrts@np.swapaxes(bank.state_sqrts, -1, -2)
+        else:
+            bank.states, bank.state_covs = batch_kalman_update(bank.states, bank.state_covs, z, z_covs, C, C_T, bank.joseph_form)
+        return self.combine()
+
+    def step(self, u, dt, z, z_cov):
+        self.predict(u, dt)
+        return self.update(z, z_cov)
+
+def ukf_backend(params=None, measurement_model=None, square_root=False, joseph_form=True, process_noise=None, noise_estimator=None, **options):
+    return UKF(params=params, measurement_model=measurement_model, square_root=square_root, joseph_form=joseph_form,
+               process_noise=process_noise, noise_estimator=noise_estimator)
+
+def augmented_ukf_backend(params=None, measurement_model=None, joseph_form=True, process_noise=None, noise_estimator=None, **options):
+    return Augmented_UKF(params=params, measurement_model=measurement_model, joseph_form=joseph_form,
+                         process_noise=process_noise, noise_estimator=noise_estimator)
+
+def ckf_backend(measurement_model=None, square_root=False, joseph_form=True, process_noise=None, noise_estimator=None, **options):
+    #the cubature rule has no tuning parameters, the unscented ones are ignored
+    return UKF(params=Cubature_Parameters(), measurement_model=measurement_model, square_root=square_root, joseph_form=joseph_form,
+               process_noise=process_noise, noise_estimator=noise_estimator)
+
+def ekf_backend(measurement_model=None, joseph_form=True, process_noise=None, noise_estimator=None, **options):
+    return EKF(measurement_model=measurement_model, joseph_form=joseph_form, process_noise=process_noise, noise_estimator=noise_estimator)
+
+def iekf_backend(measurement_model=None, joseph_form=True, process_noise=None, noise_estimator=None, iekf_iterations=5,
+                 measurement_function=None, measurement_jacobian=None, **options):
+    return Iterated_EKF(measurement_model=measurement_model, joseph_form=joseph_form, process_noise=process_noise,
+                        noise_estimator=noise_estimator, iterations=iekf_iterations,
+                        measurement_function=measurement_function, measurement_jacobian=measurement_jacobian)
+
+def pf_backend(measurement_model=None, process_noise=None, particles=10000, resample_threshold=0.5, seed=None, **options):
+    return Particle_Filter(measurement_model=measurement_model, process_noise=process_noise, particles=particles,
+                           resample_threshold=resample_threshold, seed=seed)
+
+def imm_backend(params=None, measurement_model=None, square_root=False, joseph_form=True, process_noise=None, imm_wheel_scales=(1.0, 16.0),
+                imm_slips=(0.0, 0.1), imm_input_scales=(1.0, 4.0), imm_transition=None, **options):
+    return IMM(params=params, measurement_model=measurement_model, square_root=square_root, joseph_form=joseph_form,
+               process_noise=process_noise, wheel_scales=imm_wheel_scales, slips=imm_slips, input_scales=imm_input_scales,
+               transition=imm_transition)
+
+#filter backends by name, every factory takes the shared options as keywords, uses the ones it needs and ignores the rest
+#a backend has state, state_cov and cross_cov, and predict, update, step and reset, which is all History_Filter and the nodes use
+FILTER_BACKENDS = {}
+
+#shared options that change the filter and the value that leaves them off, a backend that does not list one in its
+#supports cannot honour it, so setting it is an error instead of being ignored
+SHARED_OPTIONS = {'square_root': False, 'noise_estimator': None, 'joseph_form': True}
+
+def register_filter(name, factory, supports=()):
+    FILTER_BACKENDS[name] = (factory, frozenset(supports))
+
+def unsupported_options(name, **options):
+    #shared options set away from their off value that the backend would ignore
+    _, supports = FILTER_BACKENDS[name]
+    ignored = []
+    for key, off in SHARED_OPTIONS.items():
+        value = options.get(key, off)
+        if key not in supports and value is not off and value != off:
+            ignored.append(key)
+    return ignored
+
+def make_filter(name, **options):
+    if name not in FILTER_BACKENDS:
+        raise ValueError("unknown filter %s, available: %s" % (name, ', '.join(sorted(FILTER_BACKENDS))))
+    ignored = unsupported_options(name, **options)
+    if ignored:
+        raise ValueError("filter %s does not support %s" % (name, ', '.join(ignored)))
+    return FILTER_BACKENDS[name][0](**options)
+
+register_filter('ukf', ukf_backend, ('square_root', 'noise_estimator', 'joseph_form'))
+register_filter('augmented_ukf', augmented_ukf_backend, ('noise_estimator', 'joseph_form'))
+register_filter('ckf', ckf_backend, ('square_root', 'noise_estimator', 'joseph_form'))
+register_filter('ekf', ekf_backend, ('noise_estimator', 'joseph_form'))
+register_filter('iekf', iekf_backend, ('noise_estimator', 'joseph_form'))
+register_filter('pf', pf_backend)
+register_filter('imm', imm_backend, ('square_root', 'joseph_form'))
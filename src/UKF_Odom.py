@@ -7,255 +7,259 @@ from gazebo_msgs.msg import LinkStates
 from sensor_msgs.msg import Imu, JointState
 from std_msgs.msg import Float64
 import math
+import threading
 import numpy as np
 from message_filters import ApproximateTimeSynchronizer, Subscriber
 from tf import transformations
+from UKF_Core import History_Filter, Noise_Estimator, process_noise_model, INPUT_NOISE, UKF_Parameters, Measurement_Model, make_filter, unsupported_options, SHARED_OPTIONS, measurement_covariance, combine_measurements, IMU_ROWS, WHEEL_ROWS, WHEEL_VAR
+
+def twist_to_input(cmd_vel):
+    #commanded body velocity as the (vx, vy, omega) input of the motion model
+    return np.array([cmd_vel.linear.x, cmd_vel.linear.y, cmd_vel.angular.z])
+
+def imu_variance(imu_data, imu_var=None):
+    #the variance reported by the IMU unless a tuned value overrides it
+    return imu_data.angular_velocity_covariance[8] if imu_var is None else imu_var
+
+def sensor_measurement(imu_data, wheel_encoder_data, wheel_var=WHEEL_VAR, imu_var=None):
+    #stack the IMU yaw rate and the four wheel velocities into the measurement vector and its covariance
+    measurement = np.zeros(5).T
+    measurement[1:] = wheel_encoder_data.velocity
+    measurement[0] = imu_data.angular_velocity.z
+    z_cov = measurement_covariance(imu_variance(imu_data, imu_var), wheel_var)
+    return measurement, z_cov
+
+def fused_measurement(imu_datas, wheel_encoder_datas, wheel_var=WHEEL_VAR, imu_var=None):
+    #redundant IMUs and encoder sets combined in information form into one measurement of the usual five rows
+    measurements = [imu_measurement(imu_data, imu_var) + (IMU_ROWS,) for imu_data in imu_datas]
+    measurements += [wheel_measurement(wheel_encoder_data, wheel_var) + (WHEEL_ROWS,) for wheel_encoder_data in wheel_encoder_datas]
+    z, z_cov, _ = combine_measurements(measurements)
+    return z, z_cov
+
+def imu_measurement(imu_data, imu_var=None):
+    #yaw rate rows of the measurement on their own, for the asynchronous updates
+    return np.array([imu_data.angular_velocity.z]), np.array([[imu_variance(imu_data, imu_var)]])
+
+def wheel_measurement(wheel_encoder_data, wheel_var=WHEEL_VAR):
+    #wheel velocity rows of the measurement on their own, for the asynchronous updates
+    return np.array(wheel_encoder_data.velocity, dtype=np.float64), wheel_var*np.eye(4)
+
+def odometry_message(current_t, state, state_cov):
+    message = Odometry()
+    orientation_matrix = np.array([[np.cos(state[2]), -np.sin(state[2]), 0, 0],
+                                  [np.sin(state[2]), np.cos(state[2]), 0, 0],
+                                  [0, 0, 1, 0], [ 0, 0, 0, 1]])
+
+    message.header.stamp = current_t
+    message.header.frame_id = "odom"
+    message.child_frame_id = "base_footprint"
+
+    message.pose.pose.position = Point(state[0], state[1], 0)        
+    message.pose.pose.orientation = Quaternion(*transformations.quaternion_from_matrix(orientation_matrix))
+
+    pose_cov = np.zeros((6,6))
+    pose_cov[0, 0] = state_cov[0,0]
+    pose_cov[0,1], pose_cov[1, 0] = state_cov[0,1], state_cov[0,1]
+    pose_cov[1,1] = state_cov[1, 1]
+    pose_cov[0, -1], pose_cov[-1, 0] = state_cov[0, 2], state_cov[0, 2]
+    pose_cov[1, -1], pose_cov[-1 ,1] = state_cov[1, 2], state_cov[1, 2]
+    pose_cov[-1, -1] = state_cov[2, 2]
+
+    message.pose.covariance = pose_cov.flatten().tolist()
+
+    message.twist.twist.linear.x = state[3]
+    message.twist.twist.linear.y = state[4]
+    message.twist.twist.angular.z = state[5]
+
+    twist_cov = np.zeros((6,6))
+    twist_cov[0, 0] = state_cov[3, 3]
+    twist_cov[1, 1] = state_cov[4, 4]
+    twist_cov[-1, -1] = state_cov[5, 5]
+    twist_cov[0, -1], twist_cov[-1, 0] = state_cov[-1, 3], state_cov[-1, 3]
+    twist_cov[1, -1], twist_cov[-1, 1] = state_cov[4, -1], state_cov[-1, 4]
+
+    message.twist.covariance = twist_cov.flatten().tolist()
+
+    return message
 
 class UKF_Odometry:
     def __init__(self):
         rospy.loginfo("Initializing node...")
 
-        self.ukf_odom_pub = rospy.Publisher('/ukf_odom', Odometry, queue_size=10)
-        self.ekf_odom_pub = rospy.Publisher('/ekf_odom', Odometry, queue_size=10)
-        self.ukf_error_pub = rospy.Publisher('/ukf_error', Float64, queue_size=10)
-        self.ekf_error_pub = rospy.Publisher('/ekf_error', Float64, queue_size=10)
+        #filter backends to run, each publishes on /<name>_odom and /<name>_error, e.g. [ukf] alone on a deployed robot
+        #available: ukf, augmented_ukf, ckf, ekf, iekf, pf and imm
+        self.filter_names = rospy.get_param('~filters', ['ukf', 'ekf'])
+
+        #common parameter values for the UKF, the defaults give lambda = 1 for the 6 dimensional state
+        ukf_params = UKF_Parameters(n=6,
+                                    alpha=rospy.get_param('~alpha', 1.0),
+                                    beta=rospy.get_param('~beta', 0.0),
+                                    k=rospy.get_param('~kappa', 1.0),
+                                    lambda_value=rospy.get_param('~lambda', None))
+
+        #from robot description
+        self.measurement_model = Measurement_Model(wheel_radius=rospy.get_param('~wheel_radius', 0.0762),
+                                                   wheel_pair_separation=rospy.get_param('~wheel_pair_separation', 0.488),
+                                                   wheel_separation=rospy.get_param('~wheel_separation', 0.44715),
+                                                   wheel_width=rospy.get_param('~wheel_width', 0.05))
+
+        #measurement noise, a tuned yaml file from Auto_Tuner can set both, the IMU reported variance is used without imu_var
+        self.wheel_var = rospy.get_param('~wheel_var', WHEEL_VAR)
+        self.imu_var = rospy.get_param('~imu_var', None)
+
+        joseph_form = rospy.get_param('~joseph_form', True)
+
+        #process noise, an optional diagonal of Q per second, e.g. from Noise_Estimation, and the variance of the cmd_vel input
+        #the input noise keeps the velocity covariance from collapsing to zero, which made the full covariance UKF fail
+        self.process_noise = process_noise_model(rospy.get_param('~process_noise', None),
+                                                 rospy.get_param('~input_noise', INPUT_NOISE),
+                                                 rospy.get_param('~process_noise_resolution', 1e-4))
+
+        #optional online estimation of R and Q from a sliding window of innovations, each filter keeps its own estimate
+        #replayed steps after a late measurement are counted again, which only matters with frequent out of order messages
+        adaptive_window = rospy.get_param('~adaptive_window', 50)
+        adaptive = rospy.get_param('~adaptive_noise', False)
+
+        #~square_root makes the ukf, ckf and imm backends carry the Cholesky factor of the state covariance
+        options = {'params': ukf_params, 'measurement_model': self.measurement_model, 'joseph_form': joseph_form,
+                   'square_root': rospy.get_param('~square_root', False), 'process_noise': self.process_noise,
+                   'iekf_iterations': rospy.get_param('~iekf_iterations', 5),
+                   'particles': rospy.get_param('~particles', 10000),
+                   'resample_threshold': rospy.get_param('~resample_threshold', 0.5),
+                   'seed': rospy.get_param('~seed', None),
+                   'imm_wheel_scales': rospy.get_param('~imm_wheel_scales', [1.0, 16.0]),
+                   'imm_slips': rospy.get_param('~imm_slips', [0.0, 0.1]),
+                   'imm_input_scales': rospy.get_param('~imm_input_scales', [1.0, 4.0]),
+                   'imm_transition': rospy.get_param('~imm_transition', None)}
+
+        #bounded history of past steps so late messages are inserted at their own timestamp instead of giving a negative dt
+        history_depth = rospy.get_param('~history_depth', 100)
+
+        #optional fixed-lag RTS smoother on every backend, it keeps the newest lag+1 entries of the history smoothed
+        self.smoother_lag = rospy.get_param('~smoother_lag', 0)
+        if self.smoother_lag > 0:
+            history_depth = max(history_depth, self.smoother_lag + 1)
+
+        self.filters = {}
+        self.histories = {}
+        self.odom_pubs = {}
+        self.error_pubs = {}
+        self.smoothed_pubs = {}
+        for name in self.filter_names:
+            filter_options = dict(options, noise_estimator=Noise_Estimator(adaptive_window) if adaptive else None)
+            #shared settings a backend cannot honour are dropped for it with a warning, the other backends still use them
+            for key in unsupported_options(name, **filter_options):
+                rospy.logwarn("filter %s does not support ~%s, running it without" % (name, 'adaptive_noise' if key == 'noise_estimator' else key))
+                filter_options[key] = SHARED_OPTIONS[key]
+            self.filters[name] = make_filter(name, **filter_options)
+            self.histories[name] = History_Filter(self.filters[name], history_depth, self.smoother_lag)
+            self.odom_pubs[name] = rospy.Publisher('/%s_odom' % name, Odometry, queue_size=10)
+            self.error_pubs[name] = rospy.Publisher('/%s_error' % name, Float64, queue_size=10)
+            if self.smoother_lag > 0:
+                self.smoothed_pubs[name] = rospy.Publisher('/%s_odom_smoothed' % name, Odometry, queue_size=10)
+        #all histories see the same messages, the first one decides whether a late message is still usable
+        self.first_history = self.histories[self.filter_names[0]]
+        self.lock = threading.Lock()
 
         # Subscribers for topics
-        imu_sub = Subscriber('/imu_sim', Imu)
-        wheel_encoder_sub = Subscriber('/wheel_encoder_sim', JointState)
-        cmd_vel_sub = Subscriber('/mobile_base_controller/cmd_vel', Twist)
         gt_pose_sub = Subscriber('/omni/ground_truth/pose', PoseStamped)
         gt_twist_sub = Subscriber('/omni/ground_truth/twist', TwistStamped)
 
-        # Synchronize the topics
-        self.filter_sync = ApproximateTimeSynchronizer([imu_sub, wheel_encoder_sub, cmd_vel_sub], queue_size=10, slop=5, allow_headerless=True)
-        self.filter_sync.registerCallback(self.filter_callback)
+        #additional IMUs and wheel encoder sets on robots with redundant sensors
+        imu_topics = ['/imu_sim'] + rospy.get_param('~extra_imu_topics', [])
+        wheel_encoder_topics = ['/wheel_encoder_sim'] + rospy.get_param('~extra_wheel_encoder_topics', [])
+        self.imu_count = len(imu_topics)
+
+        self.async_updates = rospy.get_param('~async_updates', False)
+        if self.async_updates:
+            #cmd_vel drives the prediction and every sensor updates its own rows of the measurement as soon as it arrives
+            #so redundant sensors are fused by sequential updates
+            self.cmd_vel_sub = rospy.Subscriber('/mobile_base_controller/cmd_vel', Twist, self.cmd_vel_callback, queue_size=10)
+            self.imu_subs = [rospy.Subscriber(topic, Imu, self.imu_callback, queue_size=10) for topic in imu_topics]
+            self.wheel_encoder_subs = [rospy.Subscriber(topic, JointState, self.wheel_encoder_callback, queue_size=10)
+                                       for topic in wheel_encoder_topics]
+        else:
+            imu_subs = [Subscriber(topic, Imu) for topic in imu_topics]
+            wheel_encoder_subs = [Subscriber(topic, JointState) for topic in wheel_encoder_topics]
+            cmd_vel_sub = Subscriber('/mobile_base_controller/cmd_vel', Twist)
+
+            # Synchronize the topics, the extra sensors follow the first three
+            self.filter_sync = ApproximateTimeSynchronizer([imu_subs[0], wheel_encoder_subs[0], cmd_vel_sub] + imu_subs[1:] + wheel_encoder_subs[1:],
+                                                           queue_size=10, slop=5, allow_headerless=True)
+            self.filter_sync.registerCallback(self.filter_callback)
 
         self.gt_sync = ApproximateTimeSynchronizer([gt_pose_sub, gt_twist_sub], queue_size=10, slop=1.5, allow_headerless=True)
         self.gt_sync.registerCallback(self.error_callback)
 
         rospy.loginfo("Subscribers created and callback registered.")
 
-        self.ukf_state = np.zeros((6,1))
-        self.ukf_state_cov = 0.1*np.eye(6)
-
-        self.ekf_state = np.zeros((6,1))
-        self.ekf_state_cov = 0.1*np.eye(6)
-
         rospy.loginfo("init done")
 
-        self.prev_time = None
-
     def error_callback(self, gt_pose, gt_twist):
 
         x_gt = gt_pose.pose.position.x
         y_gt = gt_pose.pose.position.y
-        
-        ukf_position_error = math.sqrt((self.ukf_state[0]-x_gt)**2 + (self.ukf_state[1] - y_gt)**2)
-        ekf_position_error = math.sqrt((self.ekf_state[0]-x_gt)**2 + (self.ekf_state[1] - y_gt)**2)
 
-        ukf_error = Float64()
-        ekf_error = Float64()
+        for name, filter in self.filters.items():
+            position_error = math.sqrt((filter.state[0]-x_gt)**2 + (filter.state[1] - y_gt)**2)
+            self.error_pubs[name].publish(position_error)
 
-        ukf_error.data = ukf_position_error
-        ekf_error.data = ekf_position_error
-
-        self.ukf_error_pub.publish(ukf_position_error)
-        self.ekf_error_pub.publish(ekf_position_error)
-        
-
-
-    def filter_callback(self, imu_data, wheel_encoder_data, cmd_vel):
+    def filter_callback(self, imu_data, wheel_encoder_data, cmd_vel, *extra_data):
         #rospy.loginfo("entering callback")
-        current_t = imu_data.header.stamp
-        current_t_sec = current_t.to_sec()
-        if self.prev_time is None:
-            self.prev_time = current_t_sec
+        current_t_sec = imu_data.header.stamp.to_sec()
+        if len(self.first_history.history) == 0:
+            #the first bundle only sets the clock
+            with self.lock:
+                for history in self.histories.values():
+                    history.process(current_t_sec)
             return
-        
-        dt = current_t_sec - self.prev_time
-        self.prev_time = current_t_sec
-
-        measurement = np.zeros(5).T
-        measurement[1:] = wheel_encoder_data.velocity
-        measurement[0] = imu_data.angular_velocity.z
-        z_cov = 1.5*np.eye(5)
-        z_cov[0,0] = imu_data.angular_velocity_covariance[8]
-
-        #find EKF prediction and Predicted covariance to compare with UKF
-        EKF_pred, EKF_pred_cov = self.predict(self.ekf_state, cmd_vel, dt)
-
-        #define dimension of state for use in UKF
-        n = 6
-        
-        #define common parameter values for UKF
-        alpha = 1e-3
-        k = 3
-        beta = 2
-        lambda_value = 7 - n
-
-        #need to define the sigma points that will be used to reconstuct predicted mean and covariance
-        sigma = np.zeros((2*n+1, n))        
-        cov_sqrt = np.linalg.cholesky(np.array(self.ukf_state_cov, dtype=np.float64))
-        #rospy.loginfo(EKF_pred_cov)
-
-        #first sigma point is just the current state
-        sigma[0] = self.ukf_state.T
-        for i in range(n):
-            sigma[i+1] = self.ukf_state.T + (math.sqrt((n-k)+lambda_value)*cov_sqrt[:, i]).T
-    
-   
-        for i in range(n):
-            sigma[n+i+1] = self.ukf_state.T - (math.sqrt((n-k)+lambda_value)*cov_sqrt[:, i]).T
-
-        mean_weights = 1/(2*(n+lambda_value))*np.ones(2*n+1)
-        cov_weights = np.copy(mean_weights)
-        
-        mean_weights[0] = lambda_value/(lambda_value+n)
-        cov_weights[0] = lambda_value/(lambda_value+n)
-        weighted_pred = np.zeros((2*n+1, n))
-        weighted_cov_pred = []
-
-        mean_pred, _ = self.predict(self.ukf_state, cmd_vel, dt)
-
-        for i in range(len(sigma)):
-            pred, _ = self.predict(sigma[i], cmd_vel, dt)
-            weighted_pred[i] = (mean_weights[i]*pred).T       
-            distance = mean_pred-pred
-            A = np.outer(distance, distance)
-            weighted_cov_pred.append(cov_weights[i]*A)
-
-        #rospy.loginfo(weighted_pred)
-        pred_cov =np.zeros((6,6))
-        for matrix in weighted_cov_pred:
-            pred_cov += matrix
-        
-        pred_state = np.sum(weighted_pred, axis=0)
-        UKF_posterior, UKF_cov_posterior = self.innovation(pred_state, pred_cov, measurement, z_cov)
-        EKF_posterior, EKF_cov_posterior = self.innovation(EKF_pred.reshape(6), EKF_pred_cov, measurement, z_cov)
-
-        self.ekf_state = EKF_posterior
-        self.ekf_state_cov = EKF_cov_posterior
-
-        self.ukf_state = UKF_posterior
-        self.ukf_state_cov = UKF_cov_posterior
-
-        ukf_message = self.odometry_message(current_t, UKF_posterior, UKF_cov_posterior)
-        ekf_message = self.odometry_message(current_t, EKF_posterior, EKF_cov_posterior)
-
-        self.ekf_odom_pub.publish(ekf_message)
-        self.ukf_odom_pub.publish(ukf_message)
-        
-
-    def predict(self, state, cmd_vel, dt):
-        vx = cmd_vel.linear.x
-        vy = cmd_vel.linear.y
-        omega = cmd_vel.angular.z
-
-
-        #Jacobian to use EKF in order to compare
-        Gx = np.array([[1, 0, -(vx*np.sin(state[2]) + vy*np.cos(state[2]))*dt, dt*np.cos(state[2]), -dt*np.sin(state[2]), 0],
-                       [0, 1, (vx*np.cos(state[2]) - vy*np.sin(state[2]))*dt, dt*np.sin(state[2]), dt*np.cos(state[2]), 0],
-                       [0, 0, 1, 0, 0, dt],
-                       [0, 0, 0, 1, 0, 0],
-                       [0, 0, 0, 0, 1, 0],
-                       [0, 0, 0, 0, 0, 1]])
-
-        #implement nonlinear motion model for prediction
-        A = np.zeros((6,1))
-        A[0] = state[0] + (vx*np.cos(state[2]) - vy*np.sin(state[2]))*dt
-        A[1] = state[1] + (vy*np.cos(state[2]) + vx*np.sin(state[2]))*dt
-        A[2] = state[2] + omega*dt
-        A[3] = 0
-        A[4] = 0
-        A[5] = 0
-
-        #input is linear
-        B_u = np.zeros((6,1))
-        B_u[5] = omega
-        B_u[4] = vy
-        B_u[3] = vx
-
-        predicted_state = A + B_u
-        #No input covariance due to the way 
-
-        EKF_pred_cov = Gx@self.ekf_state_cov@Gx.T
-
-
-        return predicted_state, EKF_pred_cov
-
-    def innovation(self, pred_state, pred_cov, z, z_cov):
-        #the measurement model is linear so will use the regular kalman filter equations for the measurement
-        
-        #from robot description
-        wheel_radius = 0.0762
-        wheel_pair_separation = 0.488
-        wheel_separation = 0.44715
-        wheel_width = 0.05
-
-        b = 0.5*(wheel_separation + wheel_width)
-        a = 0.5*(wheel_radius + wheel_pair_separation)
-        roller_wheel_effect = (a+b)/wheel_radius
-
-        #implement measurement model
-        C = np.zeros((5,6))
-
-        C[0, 5] = 1
-        C[1:, 3] = 1/wheel_radius
-        C[1:, 4] = 1/wheel_radius
-        C[1:, 5] = roller_wheel_effect
-        C[1, 4] = -1*C[1,4]
-        C[4,4] = -1*C[4,4]
-        C[1,5] = -1*C[1,5]
-        C[3,5] = -1*C[3,5]
-
-        
-
-        innovation_cov = C@pred_cov@(C.T) + z_cov
-        innovation_cov = np.array(innovation_cov, dtype=np.float64)
-        K = pred_cov@(C.T)@np.linalg.inv(innovation_cov)
-        state = pred_state + K@(z - C@pred_state)
-        state_cov = (np.eye(6) - K@C)@pred_cov
-        return state, state_cov
-    
-    def odometry_message(self, current_t, state, state_cov):
-        message = Odometry()
-        orientation_matrix = np.array([[np.cos(state[2]), -np.sin(state[2]), 0, 0],
-                                      [np.sin(state[2]), np.cos(state[2]), 0, 0],
-                                      [0, 0, 1, 0], [ 0, 0, 0, 1]])
-
-        message.header.stamp = current_t
-        message.header.frame_id = "odom"
-        message.child_frame_id = "base_footprint"
-
-        message.pose.pose.position = Point(state[0], state[1], 0)        
-        message.pose.pose.orientation = Quaternion(*transformations.quaternion_from_matrix(orientation_matrix))
-
-        pose_cov = np.zeros((6,6))
-        pose_cov[0, 0] = state_cov[0,0]
-        pose_cov[0,1], pose_cov[1, 0] = state_cov[0,1], state_cov[0,1]
-        pose_cov[1,1] = state_cov[1, 1]
-        pose_cov[0, -1], pose_cov[-1, 0] = state_cov[0, 2], state_cov[0, 2]
-        pose_cov[1, -1], pose_cov[-1 ,1] = state_cov[1, 2], state_cov[1, 2]
-        pose_cov[-1, -1] = state_cov[2, 2]
-
-        message.pose.covariance = pose_cov.flatten().tolist()
-
-        message.twist.twist.linear.x = state[3]
-        message.twist.twist.linear.y = state[4]
-        message.twist.twist.angular.z = state[5]
-
-        twist_cov = np.zeros((6,6))
-        twist_cov[0, 0] = state_cov[3, 3]
-        twist_cov[1, 1] = state_cov[4, 4]
-        twist_cov[-1, -1] = state_cov[5, 5]
-        twist_cov[0, -1], twist_cov[-1, 0] = state_cov[-1, 3], state_cov[-1, 3]
-        twist_cov[1, -1], twist_cov[-1, 1] = state_cov[4, -1], state_cov[-1, 4]
-
-        message.twist.covariance = twist_cov.flatten().tolist()
-
-        return message
-        
+
+        if extra_data:
+            extra_imus = extra_data[:self.imu_count - 1]
+            extra_encoders = extra_data[self.imu_count - 1:]
+            measurement, z_cov = fused_measurement((imu_data,) + extra_imus, (wheel_encoder_data,) + extra_encoders,
+                                                   self.wheel_var, self.imu_var)
+        else:
+            measurement, z_cov = sensor_measurement(imu_data, wheel_encoder_data, self.wheel_var, self.imu_var)
+        u = twist_to_input(cmd_vel)
+
+        self.process(current_t_sec, measurement, z_cov, u=u)
+
+    def cmd_vel_callback(self, cmd_vel):
+        #the previous command is applied up to now before the new one takes over
+        now = rospy.get_rostime().to_sec()
+        with self.lock:
+            u = twist_to_input(cmd_vel)
+            for history in self.histories.values():
+                history.process(now)
+                history.set_command(u)
+
+    def imu_callback(self, imu_data):
+        z, z_cov = imu_measurement(imu_data, self.imu_var)
+        self.process(imu_data.header.stamp.to_sec(), z, z_cov, IMU_ROWS)
+
+    def wheel_encoder_callback(self, wheel_encoder_data):
+        z, z_cov = wheel_measurement(wheel_encoder_data, self.wheel_var)
+        self.process(wheel_encoder_data.header.stamp.to_sec(), z, z_cov, WHEEL_ROWS)
+
+    def process(self, t, z, z_cov, rows=None, u=None):
+        with self.lock:
+            if not self.first_history.process(t, z, z_cov, rows, u):
+                rospy.logwarn("dropping measurement at %f, older than the filter history" % t)
+                return
+            for name in self.filter_names[1:]:
+                self.histories[name].process(t, z, z_cov, rows, u)
+            #a late measurement changes the estimate at the newest time, which is what gets published
+            self.publish_estimates(rospy.Time.from_sec(self.first_history.latest_time()))
+
+            if self.smoother_lag > 0:
+                for name, history in self.histories.items():
+                    smoothed_t, smoothed_state, smoothed_cov = history.smooth()
+                    self.smoothed_pubs[name].publish(odometry_message(rospy.Time.from_sec(smoothed_t), smoothed_state, smoothed_cov))
+
+    def publish_estimates(self, current_t):
+        for name, filter in self.filters.items():
+            self.odom_pubs[name].publish(odometry_message(current_t, filter.state, filter.state_cov))
 
 
 